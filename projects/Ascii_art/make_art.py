@@ -3,19 +3,42 @@
 import cv2
 import numpy as np
 
+import argparse
+import shutil
 import sys
+import time
 
 symbols_list = ["#", "-", "*", ".", "+", "o"]
 threshold_list = [0, 50, 100, 150, 200]
 
+# ascii code of the symbol for every threshold region, so a whole image is
+# turned into characters with one indexing operation
+symbols_lookup = np.array(
+    [ord(symbols_list[i % len(symbols_list)]) for i in range(len(threshold_list))],
+    dtype=np.uint8)
+
+
 def print_out_ascii(array):
     """prints the coded image with symbols"""
 
-    for row in array:
-        for e in row:
-        	# select symbol based on the type of coding
-            print(symbols_list[int(e) % len(symbols_list)], end="")
-        print()
+    sys.stdout.write(ascii_frame(array))
+
+
+def ascii_frame(array):
+    """returns the coded image as one string, a line per row"""
+
+    chars = symbols_lookup[array.astype(np.intp)]
+    # add a newline column and turn the whole frame into text at once
+    newline = np.full((chars.shape[0], 1), ord("\n"), dtype=np.uint8)
+    return np.hstack([chars, newline]).tobytes().decode("ascii")
+
+
+def code_image(image):
+    """returns the index of the threshold region of every pixel"""
+
+    # right=True: a pixel gets region i when it is above threshold_list[i]
+    codes = np.digitize(image, threshold_list, right=True) - 1
+    return np.maximum(codes, 0)
 
 
 def img_to_ascii(image):
@@ -24,29 +47,95 @@ def img_to_ascii(image):
     # resizing parameters
     # adjust these parameters if the output doesn't fit to the screen
     height, width = image.shape
-    new_width = int(width / 20) 
+    new_width = int(width / 20)
     new_height = int(height / 40)
 
     # resize image to fit the printing screen
     resized_image = cv2.resize(image, (new_width, new_height),)
 
-    thresh_image = np.zeros(resized_image.shape)
+    return code_image(resized_image)
+
 
-    for i, threshold in enumerate(threshold_list):
-        # assign corresponding values according to the index of threshold applied
-        thresh_image[resized_image > threshold] = i
-    return thresh_image
+def fit_to_terminal(image):
+    """resizes a frame to fill the terminal, characters are about twice as tall as wide"""
+
+    columns, lines = shutil.get_terminal_size()
+    height, width = image.shape
+    new_width = columns
+    new_height = min(lines - 1, max(1, int(height * columns / width / 2)))
+    return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+
+def play(source, fps=None):
+    """renders a video file or capture device in the terminal, then prints frame timings"""
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        print("Could not open {}".format(source))
+        return
+    fps = fps or capture.get(cv2.CAP_PROP_FPS) or 30
+    frame_time = 1 / fps
+    timings = {"decode": [], "render": [], "write": [], "frame": []}
+
+    sys.stdout.write("\x1b[2J")
+    try:
+        while True:
+            start = time.perf_counter()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            decoded = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            text = ascii_frame(code_image(fit_to_terminal(gray)))
+            rendered = time.perf_counter()
+            # move the cursor home and draw the frame in a single write
+            sys.stdout.write("\x1b[H" + text)
+            sys.stdout.flush()
+            written = time.perf_counter()
+
+            timings["decode"].append(decoded - start)
+            timings["render"].append(rendered - decoded)
+            timings["write"].append(written - rendered)
+            # wait out the rest of the frame to play at the source frame rate
+            time.sleep(max(0, frame_time - (written - start)))
+            timings["frame"].append(time.perf_counter() - start)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+    print_timings(timings, fps)
+
+
+def print_timings(timings, fps):
+    frames = len(timings["frame"])
+    if not frames:
+        return
+    print("\n{} frames, target {:.1f} fps, achieved {:.1f} fps".format(
+        frames, fps, frames / sum(timings["frame"])))
+    for stage in ("decode", "render", "write"):
+        values = np.array(timings[stage]) * 1000
+        print("{:>7}: mean {:.2f} ms, p95 {:.2f} ms".format(
+            stage, values.mean(), np.percentile(values, 95)))
 
 
 if __name__ == "__main__":
 
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Print an image or play a video as ascii-art")
+    parser.add_argument("image_path", nargs="?")
+    parser.add_argument("--video", help="video file or capture device number (e.g. 0 for the webcam)")
+    parser.add_argument("--fps", type=float, help="frame rate to play at, defaults to the video's")
+    args = parser.parse_args()
+
+    if args.video is not None:
+        play(args.video, args.fps)
+        sys.exit()
+
+    if args.image_path is None:
         print("Image Path not specified : Using sample_image.png\n")
         image_path = "sample_image.png"  # default image path
-
-    if len(sys.argv) == 2:
-        print("Using {} as Image Path\n".format(sys.argv[1]))
-        image_path = sys.argv[1]
+    else:
+        print("Using {} as Image Path\n".format(args.image_path))
+        image_path = args.image_path
 
     image = cv2.imread(image_path, 0)  # read image
 
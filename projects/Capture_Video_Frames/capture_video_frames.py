@@ -1,41 +1,182 @@
+import argparse
+import csv
 import os
+import queue
 import shutil
-import sys
+import threading
 import cv2
 
+# Skipping more frames than this is done with a seek instead of grabbing each frame
+SEEK_THRESHOLD = 60
+# Frames are compared on a thumbnail of this size in keyframe mode
+SCORE_SIZE = (64, 36)
+
 class FrameCapture:
     '''
         Class definition to capture frames
     '''
-    def __init__(self, file_path):
+    def __init__(self, file_path, every=1, fps=None, timestamps=None,
+                 image_format='jpg', writers=4, queue_size=32,
+                 keyframes=False, threshold=0.3):
         '''
             initializing directory where the captured frames will be stored.
             Also truncating the directory where captured frames are stored, if exists.
+
+            every       - keep every Nth frame
+            fps         - keep frames at this rate instead, e.g. 1 for one frame per second
+            timestamps  - keep only the frames at these times, in seconds
+            writers     - threads encoding and writing frames to disk
+            queue_size  - frames allowed to wait for a writer before decoding pauses
+            keyframes   - only keep frames where the scene changes, listed in index.csv
+            threshold   - how different (0 to 1) a frame must be from the last kept one
         '''
         self.directory = "captured_frames"
         self.file_path = file_path
+        self.every = every
+        self.fps = fps
+        self.timestamps = timestamps
+        self.image_format = image_format
+        self.writers = writers
+        self.queue_size = queue_size
+        self.keyframes = keyframes
+        self.threshold = threshold
         if os.path.exists(self.directory):
             shutil.rmtree(self.directory)
         os.mkdir(self.directory)
 
+    def write_frames(self, frames):
+        '''
+            Writer thread: encoding and saving frames until it gets None.
+            imwrite releases the GIL, so several writers run in parallel.
+        '''
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            name, image = item
+            cv2.imwrite(f'{self.directory}/{name}.{self.image_format}', image)
+
+    def frame_indices(self, video):
+        '''
+            Generating the numbers of the frames to keep
+        '''
+        step = self.every
+        if self.fps:
+            source_fps = video.get(cv2.CAP_PROP_FPS) or 30
+            step = max(1.0, source_fps / self.fps)
+        total = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        count = 0
+        while True:
+            index = round(count * step)
+            if total > 0 and index >= total:
+                return
+            yield index
+            count += 1
+
+    def read_frames(self, video):
+        '''
+            Generating (name, seconds, image) for every frame to keep,
+            reading as few frames as possible to get to it
+        '''
+        if self.timestamps is not None:
+            for seconds in self.timestamps:
+                video.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
+                frame_found, image = video.read()
+                if frame_found:
+                    yield f'frame_{seconds:.3f}s', seconds, image
+            return
+
+        source_fps = video.get(cv2.CAP_PROP_FPS) or 30
+        position = 0
+        for index in self.frame_indices(video):
+            if index - position > SEEK_THRESHOLD:
+                video.set(cv2.CAP_PROP_POS_FRAMES, index)
+            else:
+                # grab skips a frame without converting it to an image
+                for _ in range(index - position):
+                    video.grab()
+            frame_found, image = video.read()
+            if not frame_found:
+                return
+            position = index + 1
+            yield f'frame{index}', index / source_fps, image
+
+    def scene_histogram(self, image):
+        '''
+            Normalized hue/saturation/value histogram of a thumbnail of the frame,
+            cheap enough to compute for every frame
+        '''
+        small = cv2.resize(image, SCORE_SIZE, interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, [16, 4, 4], [0, 180, 0, 256, 0, 256])
+        return cv2.normalize(hist, hist)
+
+    def scene_changes(self, frames):
+        '''
+            Filtering (name, seconds, image) down to the frames whose histogram
+            is far enough from the last kept frame, adding the score
+        '''
+        last = None
+        for name, seconds, image in frames:
+            hist = self.scene_histogram(image)
+            # Bhattacharyya distance: 0 for the same colors, 1 for no overlap
+            score = 1.0 if last is None else cv2.compareHist(last, hist, cv2.HISTCMP_BHATTACHARYYA)
+            if score >= self.threshold:
+                last = hist
+                yield name, seconds, image, score
+
     def capture_frames(self):
         '''
             This method captures the frames from the video file provided.
             This program makes use of openCV library
+            Decoding happens on this thread while writer threads save the
+            frames, so decoding only waits when the queue is full.
         '''
         cv2_object = cv2.VideoCapture(self.file_path)
+        frames = queue.Queue(self.queue_size)
+        threads = [threading.Thread(target=self.write_frames, args=(frames,))
+                   for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
 
-        frame_number = 0
-        frame_found = 1
-
-        while frame_found:
-            frame_found, image = cv2_object.read()
-            capture = f'{self.directory}/frame{frame_number}.jpg'
-            cv2.imwrite(capture, image)
-
-            frame_number += 1
+        frame_count = 0
+        index_file = None
+        try:
+            if self.keyframes:
+                index_file = open(f'{self.directory}/index.csv', 'w', newline='')
+                rows = csv.writer(index_file)
+                rows.writerow(['file', 'seconds', 'score'])
+                for name, seconds, image, score in self.scene_changes(self.read_frames(cv2_object)):
+                    frames.put((name, image))
+                    rows.writerow([f'{name}.{self.image_format}', f'{seconds:.3f}', f'{score:.3f}'])
+                    frame_count += 1
+            else:
+                for name, seconds, image in self.read_frames(cv2_object):
+                    frames.put((name, image))
+                    frame_count += 1
+        finally:
+            if index_file is not None:
+                index_file.close()
+            for _ in threads:
+                frames.put(None)
+            for thread in threads:
+                thread.join()
+            cv2_object.release()
+        return frame_count
 
 if __name__ == '__main__':
-    file_path = sys.argv[1]
-    fc = FrameCapture(file_path)
-    fc.capture_frames()
+    parser = argparse.ArgumentParser(description="Save the frames of a video as images")
+    parser.add_argument("file_path", help="video file")
+    parser.add_argument("--every", type=int, default=1, help="keep every Nth frame")
+    parser.add_argument("--fps", type=float, help="keep this many frames per second of video")
+    parser.add_argument("--timestamps", type=float, nargs='+', help="keep the frames at these times, in seconds")
+    parser.add_argument("--format", default='jpg', choices=['jpg', 'png', 'webp', 'bmp'])
+    parser.add_argument("--writers", type=int, default=4, help="threads writing frames to disk")
+    parser.add_argument("--keyframes", action="store_true",
+                        help="only keep frames where the scene changes, with an index.csv of their times")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="scene change score (0 to 1) needed to keep a frame in keyframe mode")
+    args = parser.parse_args()
+    fc = FrameCapture(args.file_path, args.every, args.fps, args.timestamps, args.format, args.writers,
+                      keyframes=args.keyframes, threshold=args.threshold)
+    print(f"Captured {fc.capture_frames()} frames")
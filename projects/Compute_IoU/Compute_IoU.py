@@ -1,3 +1,6 @@
+import sys
+import time
+
 import numpy as np
 
 def Cal_IoU(GT_bbox, Pred_bbox):
@@ -19,7 +22,7 @@ def Cal_IoU(GT_bbox, Pred_bbox):
 
     #2. Calculate the area of all area
     #S = S1 + S2 - area
-    S1 = (Pred_bbox[2] - GT_bbox[0] + 1) * (Pred_bbox[3] - GT_bbox[1] + 1)
+    S1 = (Pred_bbox[2] - Pred_bbox[0] + 1) * (Pred_bbox[3] - Pred_bbox[1] + 1)
     S2 = (GT_bbox[2] - GT_bbox[0] + 1) * (GT_bbox[3] - GT_bbox[1] + 1)
     S = S1 + S2 - area
 
@@ -27,7 +30,84 @@ def Cal_IoU(GT_bbox, Pred_bbox):
     iou = area / S
     return iou
 
+def iou_matrix(a, b):
+    '''
+    Args:
+        a: (N, 4) array of boxes as [xmin, ymin, xmax, ymax]
+        b: (M, 4) array of boxes as [xmin, ymin, xmax, ymax]
+    Returns:
+        IoU: (N, M) array, IoU[i, j] is Cal_IoU(a[i], b[j])
+    '''
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    #1. Intersections of every pair by broadcasting (N, 1) against (1, M)
+    ixmin = np.maximum(a[:, None, 0], b[None, :, 0])
+    iymin = np.maximum(a[:, None, 1], b[None, :, 1])
+    ixmax = np.minimum(a[:, None, 2], b[None, :, 2])
+    iymax = np.minimum(a[:, None, 3], b[None, :, 3])
+    iw = np.maximum(ixmax - ixmin + 1., 0.)
+    ih = np.maximum(iymax - iymin + 1., 0.)
+    area = iw * ih
+
+    #2. Union of every pair
+    S1 = (a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1)
+    S2 = (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
+    S = S1[:, None] + S2[None, :] - area
+
+    #3. Calculate the IoU
+    return area / S
+
+def nms(boxes, scores, threshold=0.5):
+    '''
+    Args:
+        boxes: (N, 4) array of boxes as [xmin, ymin, xmax, ymax]
+        scores: (N,) confidence of each box
+        threshold: boxes overlapping a kept box by more than this are dropped
+    Returns:
+        keep: indices of the kept boxes, highest score first
+    '''
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(scores, kind='stable')[::-1]
+    keep = []
+    while len(order):
+        keep.append(order[0])
+        # one row of IoUs at a time against the boxes not suppressed yet,
+        # memory stays O(N) instead of the full N x N matrix
+        ious = iou_matrix(boxes[order[:1]], boxes[order[1:]])[0]
+        order = order[1:][ious <= threshold]
+    return np.array(keep, dtype=np.int64)
+
+def random_boxes(n, size=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, size, (n, 2))
+    wh = rng.uniform(10, size / 10, (n, 2))
+    return np.hstack([xy, xy + wh])
+
+def benchmark(n=1000):
+    a, b = random_boxes(n, seed=0), random_boxes(n, seed=1)
+
+    start = time.perf_counter()
+    loop = np.array([[Cal_IoU(x, y) for y in b] for x in a])
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = iou_matrix(a, b)
+    matrix_time = time.perf_counter() - start
+    assert np.allclose(loop, matrix)
+
+    start = time.perf_counter()
+    keep = nms(a, np.random.default_rng(2).random(n))
+    nms_time = time.perf_counter() - start
+
+    print("{0}x{0} boxes".format(n))
+    print("Cal_IoU loop: {:.3f}s".format(loop_time))
+    print("iou_matrix:   {:.3f}s ({:.0f}x faster)".format(matrix_time, loop_time / matrix_time))
+    print("nms:          {:.3f}s, kept {} of {} boxes".format(nms_time, len(keep), n))
+
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit()
     pred_bbox = np.array([40, 40, 100, 100])
     gt_bbox = np.array([70, 80, 110, 130])
     print(Cal_IoU(pred_bbox, gt_bbox))
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Compute_IoU import iou_matrix
+
+# Below this many ground truth boxes comparing against all of them is cheaper
+# than narrowing them down first
+SWEEP_MIN_BOXES = 32
+
+def load_boxes(path):
+    '''
+    Args:
+        path: a CSV file with an image_id, class, xmin, ymin, xmax, ymax and
+              optional score column, or a JSON list of objects with those keys
+    Returns:
+        boxes: {image_id: {class: (boxes (N, 4), scores (N,))}}
+    '''
+    if path.endswith('.json'):
+        with open(path) as f:
+            records = json.load(f)
+    else:
+        with open(path, newline='') as f:
+            records = list(csv.DictReader(f))
+    grouped = defaultdict(lambda: defaultdict(list))
+    for record in records:
+        box = [float(record[key]) for key in ('xmin', 'ymin', 'xmax', 'ymax')]
+        # only a missing or empty score defaults to 1, a score of 0 is kept
+        score = record.get('score')
+        score = 1.0 if score in (None, '') else float(score)
+        grouped[str(record['image_id'])][str(record['class'])].append(box + [score])
+    boxes = {}
+    for image_id, classes in grouped.items():
+        boxes[image_id] = {}
+        for cls, rows in classes.items():
+            rows = np.array(rows, dtype=np.float64)
+            boxes[image_id][cls] = (rows[:, :4], rows[:, 4])
+    return boxes
+
+def match_image(args):
+    '''
+    Args:
+        args: (ground truth, predictions, iou_threshold) of one image, both
+              as {class: (boxes, scores)}
+    Returns:
+        matches: {class: (scores, true positive flags, number of ground truths)}
+    '''
+    gts, preds, iou_threshold = args
+    matches = {}
+    for cls in set(gts) | set(preds):
+        gt = gts.get(cls, (np.zeros((0, 4)), None))[0]
+        boxes, scores = preds.get(cls, (np.zeros((0, 4)), np.zeros(0)))
+        # Sweep along x: sort ground truth by xmin so that the boxes starting
+        # left of a prediction's right edge are a prefix of the array
+        gt = gt[np.argsort(gt[:, 0], kind='stable')]
+        matched = np.zeros(len(gt), dtype=bool)
+        tp = np.zeros(len(boxes), dtype=bool)
+        for i in np.argsort(-scores, kind='stable'):
+            box = boxes[i]
+            if len(gt) < SWEEP_MIN_BOXES:
+                candidates = np.flatnonzero(~matched)
+            else:
+                end = np.searchsorted(gt[:, 0], box[2], side='right')
+                candidates = np.flatnonzero((gt[:end, 2] >= box[0]) & ~matched[:end])
+            if not len(candidates):
+                continue
+            ious = iou_matrix(box, gt[candidates])[0]
+            best = np.argmax(ious)
+            if ious[best] >= iou_threshold:
+                tp[i] = True
+                matched[candidates[best]] = True
+        matches[cls] = (scores, tp, len(gt))
+    return matches
+
+def average_precision(scores, tp, n_gt):
+    '''
+    VOC style all-point interpolated average precision
+    '''
+    if n_gt == 0:
+        return 0.0
+    order = np.argsort(-scores, kind='stable')
+    tp = np.cumsum(tp[order])
+    fp = np.arange(1, len(tp) + 1) - tp
+    recall = np.concatenate([[0.], tp / n_gt, [1.]])
+    precision = np.concatenate([[0.], tp / np.maximum(tp + fp, 1), [0.]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.flatnonzero(recall[1:] != recall[:-1])
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+def evaluate(gt_path, pred_path, iou_threshold=0.5, workers=None):
+    '''
+    Args:
+        gt_path: ground truth boxes file, see load_boxes
+        pred_path: predicted boxes file with scores, see load_boxes
+        iou_threshold: minimum IoU for a prediction to match a ground truth
+        workers: number of processes matching images in parallel
+    Returns:
+        ap: {class: average precision}
+    '''
+    gts = load_boxes(gt_path)
+    preds = load_boxes(pred_path)
+    jobs = ((gts.get(image_id, {}), preds.get(image_id, {}), iou_threshold)
+            for image_id in set(gts) | set(preds))
+
+    scores, tps, n_gts = defaultdict(list), defaultdict(list), defaultdict(int)
+    with ProcessPoolExecutor(workers) as pool:
+        for matches in pool.map(match_image, jobs, chunksize=256):
+            for cls, (score, tp, n_gt) in matches.items():
+                scores[cls].append(score)
+                tps[cls].append(tp)
+                n_gts[cls] += n_gt
+    return {cls: average_precision(np.concatenate(scores[cls]), np.concatenate(tps[cls]), n_gts[cls])
+            for cls in sorted(n_gts) if n_gts[cls]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per class AP and mAP of detections")
+    parser.add_argument("ground_truth", help="CSV or JSON file of ground truth boxes")
+    parser.add_argument("predictions", help="CSV or JSON file of predicted boxes with scores")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU threshold for a match")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ap = evaluate(args.ground_truth, args.predictions, args.iou, args.workers)
+    for cls, value in ap.items():
+        print("{}: {:.4f}".format(cls, value))
+    print("mAP: {:.4f}".format(np.mean(list(ap.values())) if ap else 0.0))
+    print("Evaluated in {:.2f}s".format(time.perf_counter() - start))
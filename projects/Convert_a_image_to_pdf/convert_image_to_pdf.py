@@ -1,23 +1,223 @@
-import sys
-import img2pdf
+import argparse
 import os
+import re
+import shutil
+import struct
+from concurrent.futures import ProcessPoolExecutor
 
-filepath = sys.argv[1]
-if os.path.isdir(filepath):
-    with open("output.pdf", "wb") as f:
-        imgs = []
-        for fname in os.listdir(filepath):
-            if not fname.endswith(".jpg"):
-                continue
-            path = os.path.join(filepath, fname)
-            if os.path.isdir(path):
+import img2pdf
+
+# Pages are laid out at the resolution stored in the JPEG (JFIF or EXIF) like img2pdf does,
+# this is only used when the file has none
+DPI = 96
+COLORSPACES = {1: b"/DeviceGray", 3: b"/DeviceRGB", 4: b"/DeviceCMYK"}
+# EXIF orientation to clockwise page rotation, flipped orientations are left as they are
+ROTATIONS = {1: 0, 3: 180, 6: 90, 8: 270}
+
+
+def natural_key(name):
+    # page2.jpg sorts before page10.jpg
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def list_jpgs(dirpath):
+    names = [fname for fname in os.listdir(dirpath)
+             if fname.lower().endswith((".jpg", ".jpeg"))
+             and not os.path.isdir(os.path.join(dirpath, fname))]
+    return [os.path.join(dirpath, fname) for fname in sorted(names, key=natural_key)]
+
+
+def jfif_dpi(segment):
+    """Return (xdpi, ydpi) from a JFIF APP0 segment, or None when it only gives an aspect ratio."""
+    if not segment.startswith(b"JFIF\0") or len(segment) < 12:
+        return None
+    units, xdensity, ydensity = struct.unpack(">BHH", segment[7:12])
+    if units == 1:
+        return xdensity, ydensity
+    if units == 2:
+        return xdensity * 2.54, ydensity * 2.54
+    return None
+
+
+def exif_tags(segment):
+    """Return (dpi, rotation) from the first IFD of an EXIF APP1 segment, each None when missing."""
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if not segment.startswith(b"Exif\0\0") or order is None:
+        return None, None
+    ifd = struct.unpack(order + "I", tiff[4:8])[0]
+    count = struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]
+    tags = {}
+    for entry in range(ifd + 2, ifd + 2 + 12 * count, 12):
+        tag, kind, _, value = struct.unpack(order + "HHII", tiff[entry:entry + 12])
+        if kind == 3:
+            # a SHORT is stored in the first two bytes of the value field
+            tags[tag] = struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+        elif kind == 5:
+            numerator, denominator = struct.unpack(order + "II", tiff[value:value + 8])
+            tags[tag] = numerator / denominator if denominator else 0
+    dpi = None
+    if tags.get(0x011A) and tags.get(0x011B):
+        # ResolutionUnit 2 is inches (the default), 3 is centimeters
+        factor = 2.54 if tags.get(0x0128) == 3 else 1
+        dpi = tags[0x011A] * factor, tags[0x011B] * factor
+    return dpi, ROTATIONS.get(tags.get(0x0112))
+
+
+def jpeg_header(path):
+    """Return (path, width, height, components, (xdpi, ydpi), rotation) read from the JPEG header,
+    or (path, None, None, None, None, None)."""
+    dpi = exif_dpi = rotation = None
+    try:
+        with open(path, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return path, None, None, None, None, None
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                if marker[1] == 0xFF:
+                    # fill byte, the marker starts one byte later
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD7:
+                    continue
+                length = struct.unpack(">H", f.read(2))[0]
+                # start of frame markers, except DHT, JPG and DAC
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    _, height, width, components = struct.unpack(">BHHB", f.read(6))
+                    if width and height and components in COLORSPACES:
+                        # JFIF density first, then EXIF resolution, like Pillow reads it
+                        dpi = dpi or exif_dpi
+                        if not dpi or not all(round(d) for d in dpi):
+                            dpi = (DPI, DPI)
+                        return (path, width, height, components,
+                                (round(dpi[0]), round(dpi[1])), rotation or 0)
+                    break
+                if marker[1] == 0xE0 and dpi is None:
+                    dpi = jfif_dpi(f.read(length - 2))
+                elif marker[1] == 0xE1 and exif_dpi is None and rotation is None:
+                    try:
+                        exif_dpi, rotation = exif_tags(f.read(length - 2))
+                    except struct.error:
+                        # a broken EXIF block does not make the image unusable
+                        pass
+                else:
+                    f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        pass
+    return path, None, None, None, None, None
+
+
+class StreamingPdf:
+    """Write JPEG pages to a PDF one at a time, keeping only object offsets in memory."""
+
+    def __init__(self, filename):
+        self.file = open(filename, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # 1 is the catalog and 2 the page tree, both written at the end
+        self.offsets = {}
+        self.next_id = 3
+        self.pages = []
+
+    def start_object(self, obj_id):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % obj_id)
+
+    def add_jpeg(self, path, width, height, components, dpi=(DPI, DPI), rotation=0):
+        image_id, content_id, page_id = self.next_id, self.next_id + 1, self.next_id + 2
+        self.next_id += 3
+        w, h = width * 72 / dpi[0], height * 72 / dpi[1]
+
+        self.start_object(image_id)
+        decode = b" /Decode [1 0 1 0 1 0 1 0]" if components == 4 else b""
+        self.file.write(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s"
+                        b" /BitsPerComponent 8 /Filter /DCTDecode%s /Length %d >>\nstream\n"
+                        % (width, height, COLORSPACES[components], decode, os.path.getsize(path)))
+        # the JPEG data goes into the PDF as is, copied in chunks
+        with open(path, "rb") as img:
+            shutil.copyfileobj(img, self.file)
+        self.file.write(b"\nendstream\nendobj\n")
+
+        content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (w, h)
+        self.start_object(content_id)
+        self.file.write(b"<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(content), content))
+
+        self.start_object(page_id)
+        # the page is turned upright by the viewer, the same way img2pdf applies EXIF orientation
+        rotate = b" /Rotate %d" % rotation if rotation else b""
+        self.file.write(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f]%s"
+                        b" /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>\nendobj\n"
+                        % (w, h, rotate, image_id, content_id))
+        self.pages.append(page_id)
+
+    def close(self):
+        self.start_object(2)
+        kids = b" ".join(b"%d 0 R" % page for page in self.pages)
+        self.file.write(b"<< /Type /Pages /Kids [%s] /Count %d >>\nendobj\n" % (kids, len(self.pages)))
+        self.start_object(1)
+        self.file.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        xref = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id)
+        for obj_id in range(1, self.next_id):
+            self.file.write(b"%010d 00000 n \n" % self.offsets[obj_id])
+        self.file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                        % (self.next_id, xref))
+        self.file.close()
+
+
+def volume_name(output, number):
+    base, ext = os.path.splitext(output)
+    return f"{base}_{number:03d}{ext}"
+
+
+def stream_to_pdf(imgs, output, volume_pages=None, workers=None):
+    """Validate the headers in parallel and append every good page to the PDF as soon as it is checked."""
+    pdf = None
+    volume = 0
+    written = 0
+    with ProcessPoolExecutor(workers) as pool:
+        # map keeps the page order and yields results while later headers are still read
+        for path, width, height, components, dpi, rotation in pool.map(jpeg_header, imgs, chunksize=64):
+            if width is None:
+                print(f"skipping invalid JPEG: {path}")
                 continue
-            imgs.append(path)
-        f.write(img2pdf.convert(imgs))
-elif os.path.isfile(filepath):
-    if filepath.endswith(".jpg"):
-        with open("output.pdf", "wb") as f:
-            f.write(img2pdf.convert(filepath))
-else:
-    print("please input file or dir")
+            if pdf is None:
+                volume += 1
+                pdf = StreamingPdf(volume_name(output, volume) if volume_pages else output)
+            pdf.add_jpeg(path, width, height, components, dpi, rotation)
+            written += 1
+            if volume_pages and len(pdf.pages) >= volume_pages:
+                pdf.close()
+                pdf = None
+    if pdf is not None:
+        pdf.close()
+    print(f"wrote {written} pages" + (f" in {volume} volumes" if volume_pages else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JPG images to a PDF file")
+    parser.add_argument("filepath", help="JPG file or directory of JPG files")
+    parser.add_argument("-o", "--output", default="output.pdf")
+    parser.add_argument("--stream", action="store_true",
+                        help="write pages one by one instead of building the PDF in memory")
+    parser.add_argument("--volume-pages", type=int, default=None,
+                        help="with --stream, start a new numbered PDF every this many pages")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
 
+    filepath = args.filepath
+    if os.path.isdir(filepath):
+        imgs = list_jpgs(filepath)
+        if args.stream or args.volume_pages:
+            stream_to_pdf(imgs, args.output, args.volume_pages, args.workers)
+        else:
+            with open(args.output, "wb") as f:
+                f.write(img2pdf.convert(imgs))
+    elif os.path.isfile(filepath):
+        if filepath.endswith(".jpg"):
+            with open(args.output, "wb") as f:
+                f.write(img2pdf.convert(filepath))
+    else:
+        print("please input file or dir")
@@ -1,39 +1,233 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import cv2
 import numpy as np
+from PIL import Image
+
+# Images are shrunk so their longest side is at most this many pixels,
+# the palette of a thumbnail is the palette of the picture
+MAX_SIDE = 256
+# Bits kept per channel when histogramming, 4 bits gives 16x16x16 color bins
+BITS = 4
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
 
-path = input("Enter Path :- ")
-try:
+def load_image(path, max_side=MAX_SIDE):
+    '''
+        Reading the image and downsampling it before any color work
+    '''
     img = cv2.imread(path)
-    cv2.imshow("img", img)
-except Exception:
-    print("Path not found")
-    exit()
+    if img is None:
+        raise FileNotFoundError(f"Path not found: {path}")
+    return shrink(img, max_side)
+
+
+def shrink(img, max_side=MAX_SIDE):
+    scale = max_side / max(img.shape[:2])
+    if scale < 1:
+        size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def histogram_colors(pixels, k, bits=BITS):
+    '''
+        Quantizing every pixel and packing B, G and R into one uint32 key,
+        so colors (not single channel values) are counted in one bincount.
+        The color of a bin is the mean of the pixels that fell in it.
+    '''
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.uint32)
+    keys = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    bins = 1 << (3 * bits)
+    counts = np.bincount(keys, minlength=bins)
+    top = np.argsort(counts)[::-1][:k]
+    top = top[counts[top] > 0]
+    sums = np.stack([np.bincount(keys, weights=pixels[:, c], minlength=bins)[top]
+                     for c in range(3)], axis=1)
+    return sums / counts[top, None], counts[top]
+
+
+def kmeans_colors(pixels, k, sample=10000, batch=1024, iterations=100, seed=0):
+    '''
+        Mini-batch k-means on a random sample of the pixels, seeded with
+        the histogram colors. Coverage is counted over all given pixels.
+    '''
+    rng = np.random.default_rng(seed)
+    pixels = pixels.astype(np.float32)
+    if len(pixels) > sample:
+        data = pixels[rng.choice(len(pixels), sample, replace=False)]
+    else:
+        data = pixels
+    centers = histogram_colors(pixels.astype(np.uint8), k)[0].astype(np.float32)
+    seen = np.zeros(len(centers))
+    for _ in range(iterations):
+        points = data[rng.integers(0, len(data), min(batch, len(data)))]
+        nearest = nearest_center(points, centers)
+        for c in np.unique(nearest):
+            members = points[nearest == c]
+            seen[c] += len(members)
+            # per center learning rate decays with the points it has absorbed
+            rate = len(members) / seen[c]
+            centers[c] += rate * (members.mean(axis=0) - centers[c])
+    counts = np.bincount(nearest_center(pixels, centers), minlength=len(centers))
+    order = np.argsort(counts)[::-1]
+    order = order[counts[order] > 0]
+    return centers[order], counts[order]
+
+
+def nearest_center(points, centers):
+    distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    return distances.argmin(axis=1)
+
+
+def dominant_colors(img, k=3, method='histogram'):
+    '''
+        Returning the k most common colors of a BGR image as a list of
+        ((b, g, r), percentage of the image covered)
+    '''
+    pixels = shrink(img).reshape(-1, 3)
+    if method == 'kmeans':
+        colors, counts = kmeans_colors(pixels, k)
+    else:
+        colors, counts = histogram_colors(pixels, k)
+    coverage = counts * 100 / len(pixels)
+    return [(tuple(int(round(v)) for v in color), float(pct))
+            for color, pct in zip(colors, coverage)]
+
+
+def decode_small(data, max_side=MAX_SIDE):
+    '''
+        Decoding image bytes with PIL in draft mode, so JPEGs are scaled
+        down by the decoder (1/2 to 1/8) instead of decoded at full size
+    '''
+    img = Image.open(io.BytesIO(data))
+    img.draft('RGB', (max_side, max_side))
+    rgb = np.asarray(img.convert('RGB'))
+    return shrink(np.ascontiguousarray(rgb[:, :, ::-1]), max_side)
+
+
+def cache_key(data, k, method):
+    # the settings are part of the key so changing them never reuses old palettes
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}:{k}:{method}:{MAX_SIDE}:{BITS}"
+
+
+def open_cache(path):
+    db = sqlite3.connect(path, timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS palettes (key TEXT PRIMARY KEY, palette TEXT)")
+    return db
+
+
+_cache = None
+
+
+def init_worker(cache_path):
+    global _cache
+    _cache = sqlite3.connect(cache_path, timeout=60)
 
 
-array = np.array(img)
-unique, counts = np.unique(array, return_counts=True)
+def palette_of_file(path, k, method):
+    '''
+        Worker: hashing the file and returning its cached palette, or
+        computing it. The flag tells the parent whether to store it.
+        A file that cannot be read gives no palette instead of stopping the run.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return path, None, None, False
+    key = cache_key(data, k, method)
+    row = _cache.execute("SELECT palette FROM palettes WHERE key = ?", (key,)).fetchone()
+    if row:
+        return path, key, json.loads(row[0]), False
+    try:
+        palette = dominant_colors(decode_small(data), k, method)
+    except (OSError, ValueError):
+        return path, key, None, False
+    return path, key, palette, True
 
-ocurrance = dict(zip(unique, counts))
 
+def process_directory(directory, output, k=3, method='histogram', cache_path=None, workers=None):
+    '''
+        Finding the palette of every image under directory with a process
+        pool and writing them all to a CSV or JSON file
+    '''
+    cache_path = cache_path or os.path.join(directory, '.palette_cache.sqlite')
+    db = open_cache(cache_path)
+    paths = (os.path.join(root, name)
+             for root, _, names in os.walk(directory)
+             for name in names if name.lower().endswith(EXTENSIONS))
 
-a1_sorted_keys = sorted(ocurrance, key=ocurrance.get, reverse=True)
-print(a1_sorted_keys[:3])
+    results = {}
+    computed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cache_path,)) as pool:
+        jobs = pool.map(partial(palette_of_file, k=k, method=method), paths, chunksize=64)
+        for path, key, palette, new in jobs:
+            if palette is None:
+                print(f"Skipping unreadable image: {path}")
+                continue
+            results[os.path.relpath(path, directory)] = palette
+            if new:
+                computed += 1
+                db.execute("INSERT OR REPLACE INTO palettes VALUES (?, ?)", (key, json.dumps(palette)))
+                if computed % 1000 == 0:
+                    db.commit()
+    db.commit()
+    db.close()
 
+    if output.endswith('.json'):
+        with open(output, 'w') as f:
+            json.dump({path: [{'color': hex_color(bgr), 'coverage': round(pct, 2)} for bgr, pct in palette]
+                       for path, palette in results.items()}, f, indent=2)
+    else:
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'rank', 'color', 'coverage'])
+            for path, palette in results.items():
+                for rank, (bgr, pct) in enumerate(palette, 1):
+                    writer.writerow([path, rank, hex_color(bgr), f"{pct:.2f}"])
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} images ({computed} computed, {len(results) - computed} cached) "
+          f"in {elapsed:.1f}s, palettes written to {output}")
 
-# Create a blank 300x300 black image
-image = np.zeros((300, 300, 3), np.uint8)
-# Fill image with red color(set each pixel to red)
-image[:] = a1_sorted_keys[:3]
 
+def hex_color(bgr):
+    b, g, r = bgr
+    return f"#{r:02x}{g:02x}{b:02x}"
 
-c = a1_sorted_keys[0]
 
-# Create a blank 300x300 black image
-color = np.zeros((300, 300, 3), np.uint8)
-# Fill image with red color(set each pixel to red)
-color[:] = (c, c, c)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the dominant colors of an image")
+    parser.add_argument("path", nargs='?', help="image or directory of images to analyse")
+    parser.add_argument("-k", type=int, default=3, help="number of colors to report")
+    parser.add_argument("--method", choices=['histogram', 'kmeans'], default='histogram')
+    parser.add_argument("--output", default="palettes.csv",
+                        help="CSV or JSON file for the palettes of a directory")
+    parser.add_argument("--cache", help="palette cache file, defaults to .palette_cache.sqlite in the directory")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
 
-print("Tone : " + str(a1_sorted_keys[:3]))
-cv2.imshow("Tone", image)
-print("color : " + str([c, c, c]))
-cv2.imshow("color", color)
+    path = args.path or input("Enter Path :- ")
+    if os.path.isdir(path):
+        process_directory(path, args.output, args.k, args.method, args.cache, args.workers)
+        exit()
+    try:
+        img = load_image(path)
+    except FileNotFoundError as e:
+        print(e)
+        exit()
+    for bgr, pct in dominant_colors(img, args.k, args.method):
+        print(f"{hex_color(bgr)}  BGR {bgr}  {pct:.1f}%")
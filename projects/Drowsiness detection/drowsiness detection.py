@@ -1,106 +1,272 @@
+import argparse
 import cv2
+import json
 import os
+from collections import defaultdict
 from keras.models import load_model
 import numpy as np
-from pygame import mixer
+import threading
 import time
 
 
-mixer.init()
-sound = mixer.Sound('alarm.wav')
-
-face = cv2.CascadeClassifier('haar cascade files\haarcascade_frontalface_alt.xml')
-leye = cv2.CascadeClassifier('haar cascade files\haarcascade_lefteye_2splits.xml')
-reye = cv2.CascadeClassifier('haar cascade files\haarcascade_righteye_2splits.xml')
+face = cv2.CascadeClassifier(os.path.join('haar cascade files', 'haarcascade_frontalface_alt.xml'))
+leye = cv2.CascadeClassifier(os.path.join('haar cascade files', 'haarcascade_lefteye_2splits.xml'))
+reye = cv2.CascadeClassifier(os.path.join('haar cascade files', 'haarcascade_righteye_2splits.xml'))
 
 
 
 lbl=['Close','Open']
 
-model = load_model('models/cnncat2.h5')
-path = os.getcwd()
-cap = cv2.VideoCapture(0)
-font = cv2.FONT_HERSHEY_COMPLEX_SMALL
-count=0
-score=0
-thicc=2
-rpred=[99]
-lpred=[99]
-
-while(True):
-    ret, frame = cap.read()
-    height,width = frame.shape[:2] 
-
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    faces = face.detectMultiScale(gray,minNeighbors=5,scaleFactor=1.1,minSize=(25,25))
-    left_eye = leye.detectMultiScale(gray)
-    right_eye =  reye.detectMultiScale(gray)
-
-    cv2.rectangle(frame, (0,height-50) , (200,height) , (0,0,0) , thickness=cv2.FILLED )
-
-    for (x,y,w,h) in faces:
-        cv2.rectangle(frame, (x,y) , (x+w,y+h) , (100,100,100) , 1 )
-
-    for (x,y,w,h) in right_eye:
-        r_eye=frame[y:y+h,x:x+w]
-        count=count+1
-        r_eye = cv2.cvtColor(r_eye,cv2.COLOR_BGR2GRAY)
-        r_eye = cv2.resize(r_eye,(24,24))
-        r_eye= r_eye/255
-        r_eye=  r_eye.reshape(24,24,-1)
-        r_eye = np.expand_dims(r_eye,axis=0)
-        rpred = model.predict_classes(r_eye)
-        if(rpred[0]==1):
-            lbl='Open' 
-        if(rpred[0]==0):
-            lbl='Closed'
-        break
-
-    for (x,y,w,h) in left_eye:
-        l_eye=frame[y:y+h,x:x+w]
-        count=count+1
-        l_eye = cv2.cvtColor(l_eye,cv2.COLOR_BGR2GRAY)  
-        l_eye = cv2.resize(l_eye,(24,24))
-        l_eye= l_eye/255
-        l_eye=l_eye.reshape(24,24,-1)
-        l_eye = np.expand_dims(l_eye,axis=0)
-        lpred = model.predict_classes(l_eye)
-        if(lpred[0]==1):
-            lbl='Open'   
-        if(lpred[0]==0):
-            lbl='Closed'
-        break
-
-    if(rpred[0]==0 and lpred[0]==0):
-        score=score+1
-        cv2.putText(frame,"Closed",(10,height-20), font, 1,(255,255,255),1,cv2.LINE_AA)
-    # if(rpred[0]==1 or lpred[0]==1):
-    else:
-        score=score-1
-        cv2.putText(frame,"Open",(10,height-20), font, 1,(255,255,255),1,cv2.LINE_AA)
-    
-        
-    if(score<0):
-        score=0   
-    cv2.putText(frame,'Score:'+str(score),(100,height-20), font, 1,(255,255,255),1,cv2.LINE_AA)
-    if(score>15):
-        #person is feeling sleepy so we beep the alarm
-        cv2.imwrite(os.path.join(path,'image.jpg'),frame)
-        try:
-            sound.play()
-            
-        except:  # isplaying = False
-            pass
-        if(thicc<16):
-            thicc= thicc+2
+
+class LatestFrame:
+    '''Reads the camera on its own thread and keeps only the newest frame,
+    so the detection loop never waits on the camera and never falls behind it.'''
+
+    def __init__(self, source):
+        self.cap = cv2.VideoCapture(source)
+        self.frame = None
+        self.number = 0
+        self.time = 0
+        self.running = True
+        self.ready = threading.Condition()
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def update(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            with self.ready:
+                if not ret:
+                    self.running = False
+                else:
+                    self.frame = frame
+                    self.number += 1
+                    self.time = time.perf_counter()
+                self.ready.notify_all()
+
+    def read(self, last=0):
+        '''Returns the newest frame, its number and when it was captured, waiting
+        only when the frame after `last` has not been captured yet. None once the camera stops.'''
+        with self.ready:
+            self.ready.wait_for(lambda: self.number > last or not self.running)
+            if self.number > last:
+                return self.frame, self.number, self.time
+            return None, last, None
+
+    def release(self):
+        self.running = False
+        self.thread.join()
+        self.cap.release()
+
+
+class EveryFrame:
+    '''Reads a video file frame by frame with the same interface as LatestFrame,
+    so the same clip always gives the same frames and results.'''
+
+    def __init__(self, source):
+        self.cap = cv2.VideoCapture(source)
+
+    def read(self, last=0):
+        ret, frame = self.cap.read()
+        if not ret:
+            return None, last, None
+        return frame, last + 1, time.perf_counter()
+
+    def release(self):
+        self.cap.release()
+
+
+def find_eyes(gray, faces):
+    '''Searches for the eyes only in the upper half of the largest face,
+    returns the first right eye and left eye box found (or None) in frame coordinates.'''
+    if len(faces) == 0:
+        return None, None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    roi = gray[y:y + h // 2, x:x + w]
+    eyes = []
+    for cascade in (reye, leye):
+        found = cascade.detectMultiScale(roi)
+        if len(found):
+            ex, ey, ew, eh = found[0]
+            eyes.append((x + ex, y + ey, ew, eh))
+        else:
+            eyes.append(None)
+    return eyes
+
+
+def eye_input(gray, box):
+    x, y, w, h = box
+    eye = cv2.resize(gray[y:y+h, x:x+w], (24, 24))
+    return (eye / 255).reshape(24, 24, 1)
+
+
+def eye_batch(gray, boxes):
+    '''Stacks the crops of the eyes that were found into one model input, None if there are none.'''
+    found = [box for box in boxes if box is not None]
+    if not found:
+        return None
+    return np.stack([eye_input(gray, box) for box in found])
+
+
+def predict_eyes(model, batch, boxes):
+    '''Classifies every eye of the batch with a single call to the model,
+    returns 0 (closed) or 1 (open) per box, None where no eye was found.'''
+    if batch is None:
+        return [None] * len(boxes)
+    classes = iter(np.argmax(model.predict_on_batch(batch), axis=1))
+    return [None if box is None else int(next(classes)) for box in boxes]
+
+
+def summary(values):
+    values = np.array(values) * 1000
+    if not len(values):
+        return {}
+    return {'mean_ms': round(float(values.mean()), 3),
+            'p50_ms': round(float(np.percentile(values, 50)), 3),
+            'p90_ms': round(float(np.percentile(values, 90)), 3),
+            'p95_ms': round(float(np.percentile(values, 95)), 3),
+            'p99_ms': round(float(np.percentile(values, 99)), 3),
+            'max_ms': round(float(values.max()), 3)}
+
+
+def make_report(source, frames, seconds, timings, counts):
+    report = {'source': str(source),
+              'frames': frames,
+              'seconds': round(seconds, 3),
+              'fps': round(frames / seconds, 2) if seconds else 0,
+              'stages': {stage: summary(timings[stage])
+                         for stage in ('face_cascade', 'eye_cascades', 'preprocess', 'cnn')},
+              'latency': summary(timings['latency'])}
+    report.update(counts)
+    return report
+
+
+def print_report(report):
+    print('{} frames in {:.2f}s ({:.2f} fps)'.format(report['frames'], report['seconds'], report['fps']))
+    for stage, values in list(report['stages'].items()) + [('latency', report['latency'])]:
+        if values:
+            print('{:>13}: mean {:.2f} ms, p50 {:.2f} ms, p95 {:.2f} ms, p99 {:.2f} ms'.format(
+                stage, values['mean_ms'], values['p50_ms'], values['p95_ms'], values['p99_ms']))
+
+
+
+def run(source, model, headless=False):
+    """Runs the detector with the eye model on a camera or video file and returns a report of how long every stage took.
+    headless leaves out the window and the alarm, so it can run on a machine without a screen or speakers."""
+    if not headless:
+        from pygame import mixer
+        mixer.init()
+        sound = mixer.Sound('alarm.wav')
+
+    path = os.getcwd()
+    cap = LatestFrame(source) if isinstance(source, int) else EveryFrame(source)
+    font = cv2.FONT_HERSHEY_COMPLEX_SMALL
+    count=0
+    score=0
+    thicc=2
+    rpred=[99]
+    lpred=[99]
+    number=0
+    frames=0
+    closed_frames=0
+    alarm_frames=0
+    timings = defaultdict(list)
+    start = time.perf_counter()
+
+    while(True):
+        frame, number, captured = cap.read(number)
+        if frame is None:
+            break
+        height,width = frame.shape[:2]
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        t0 = time.perf_counter()
+        faces = face.detectMultiScale(gray,minNeighbors=5,scaleFactor=1.1,minSize=(25,25))
+        t1 = time.perf_counter()
+        right_eye, left_eye = find_eyes(gray, faces)
+        t2 = time.perf_counter()
+        batch = eye_batch(gray, [right_eye, left_eye])
+        t3 = time.perf_counter()
+        # an eye that was not found this frame keeps its last prediction
+        r, l = predict_eyes(model, batch, [right_eye, left_eye])
+        t4 = time.perf_counter()
+        timings['face_cascade'].append(t1 - t0)
+        timings['eye_cascades'].append(t2 - t1)
+        if batch is not None:
+            timings['preprocess'].append(t3 - t2)
+            timings['cnn'].append(t4 - t3)
+
+        if r is not None:
+            count=count+1
+            rpred=[r]
+        if l is not None:
+            count=count+1
+            lpred=[l]
+
+        if(rpred[0]==0 and lpred[0]==0):
+            score=score+1
+            closed_frames=closed_frames+1
+            lbl="Closed"
+        # if(rpred[0]==1 or lpred[0]==1):
         else:
-            thicc=thicc-2
-            if(thicc<2):
-                thicc=2
-        cv2.rectangle(frame,(0,0),(width,height),(0,0,255),thicc) 
-    cv2.imshow('frame',frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-cap.release()
-cv2.destroyAllWindows()
+            score=score-1
+            lbl="Open"
+
+        if(score<0):
+            score=0
+        if(score>15):
+            alarm_frames=alarm_frames+1
+        # from the frame being captured to knowing whether to sound the alarm
+        timings['latency'].append(time.perf_counter() - captured)
+        frames=frames+1
+
+        if headless:
+            continue
+
+        cv2.rectangle(frame, (0,height-50) , (200,height) , (0,0,0) , thickness=cv2.FILLED )
+
+        for (x,y,w,h) in faces:
+            cv2.rectangle(frame, (x,y) , (x+w,y+h) , (100,100,100) , 1 )
+
+        cv2.putText(frame,lbl,(10,height-20), font, 1,(255,255,255),1,cv2.LINE_AA)
+        cv2.putText(frame,'Score:'+str(score),(100,height-20), font, 1,(255,255,255),1,cv2.LINE_AA)
+        if(score>15):
+            #person is feeling sleepy so we beep the alarm
+            cv2.imwrite(os.path.join(path,'image.jpg'),frame)
+            try:
+                sound.play()
+
+            except:  # isplaying = False
+                pass
+            if(thicc<16):
+                thicc= thicc+2
+            else:
+                thicc=thicc-2
+                if(thicc<2):
+                    thicc=2
+            cv2.rectangle(frame,(0,0),(width,height),(0,0,255),thicc)
+        cv2.imshow('frame',frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    cap.release()
+    if not headless:
+        cv2.destroyAllWindows()
+    return make_report(source, frames, time.perf_counter() - start, timings,
+                       {'eyes_classified': count, 'closed_frames': closed_frames, 'alarm_frames': alarm_frames})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sound an alarm when the eyes stay closed')
+    parser.add_argument('--video', help='video file to read instead of the webcam, every frame is processed in order')
+    parser.add_argument('--headless', action='store_true', help='no window and no alarm sound, e.g. to benchmark a clip')
+    parser.add_argument('--report', help='write the stage timings and latency percentiles to this JSON file')
+    args = parser.parse_args()
+
+    model = load_model('models/cnncat2.h5')
+    report = run(args.video if args.video else 0, model, args.headless)
+    if args.headless or args.report:
+        print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -1,8 +1,13 @@
 import cv2
 import os
+import sys
 from pathlib import Path
 from ffpyplayer.player import MediaPlayer
 
+# The file index is shared with the Easy_cartoonify project.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Easy_cartoonify"))
+from file_index import FileIndex  # noqa: E402
+
 
 # User input for the name of the image file.
 video_name = input("Name of the video file that you want to play:    ")
@@ -12,13 +17,11 @@ video_directory_guess = input("Directory that may contain the video:    ")
 
 
 # This function finds your file. If you don't know the directory just type '/'
+# The file index remembers the directories it has seen, so only the first search of a tree is slow.
 def find_the_video(file_name, directory_name):
-    files_found = []
-    for path, subdirs, files in os.walk(directory_name):
-        for name in files:
-            if(file_name == name):
-                file_path = os.path.join(path, name)
-                files_found.append(file_path)
+    files_found = FileIndex().find(file_name, directory_name)
+    if not files_found:
+        sys.exit("Could not find " + file_name + " in " + directory_name)
 
     print(files_found)
     return files_found[0]  # Return the path.
@@ -34,7 +37,7 @@ new_working_directory = video_directory.parent
 os.chdir(new_working_directory)
 
 
-video_path = find_the_video(video_name, video_directory_guess)
+video_path = str(video_directory)
 
 
 def PlayVideo(video_path):
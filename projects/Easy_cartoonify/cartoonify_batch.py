@@ -0,0 +1,167 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+## The two styles of easy_cartoonify.py as (sigma_s, sigma_r).
+STYLES = {"1": (150, 0.25), "2": (60, 0.5)}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+STOP = object()
+
+
+## Runs func on every item of inbox in its own worker threads and puts the results in outbox.
+## OpenCV releases the GIL while it works, so threads of one stage really run side by side.
+def stage(func, inbox, outbox, workers):
+    def work():
+        while True:
+            item = inbox.get()
+            if item is STOP:
+                inbox.put(STOP)  ## Let the other workers of this stage see it too.
+                return
+            try:
+                result = func(item)
+            except Exception as error:
+                print("Error:", error)
+                continue
+            if outbox is not None and result is not None:
+                outbox.put(result)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    def close():
+        for thread in threads:
+            thread.join()
+        if outbox is not None:
+            outbox.put(STOP)
+
+    closer = threading.Thread(target=close, daemon=True)
+    closer.start()
+    return closer
+
+
+def make_stylizer(style, scale):
+    sigma_s, sigma_r = STYLES[style]
+
+    ## Stylizing a smaller copy and scaling the result back up trades detail for speed,
+    ## the work drops with the square of the scale (0.5 is about 4x faster).
+    def stylize(item):
+        key, image = item
+        if scale < 1:
+            height, width = image.shape[:2]
+            small = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+            cartoon = cv2.resize(cv2.stylization(small, sigma_s=sigma_s, sigma_r=sigma_r),
+                                 (width, height), interpolation=cv2.INTER_LINEAR)
+        else:
+            cartoon = cv2.stylization(image, sigma_s=sigma_s, sigma_r=sigma_r)
+        return key, cartoon
+
+    return stylize
+
+
+def cartoonify_folder(source, target, style="1", scale=1.0, workers=(2, os.cpu_count() or 1, 2), queue_size=16):
+    decode_workers, stylize_workers, encode_workers = workers
+    paths, decoded, stylized = (queue.Queue(queue_size) for _ in range(3))
+
+    def decode(item):
+        source_path, target_path = item
+        image = cv2.imread(source_path)
+        if image is None:
+            print("Could not read", source_path)
+            return None
+        return target_path, image
+
+    done = []
+
+    def encode(item):
+        target_path, image = item
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        cv2.imwrite(target_path, image)
+        done.append(target_path)
+
+    start = time.perf_counter()
+    stages = [
+        stage(decode, paths, decoded, decode_workers),
+        stage(make_stylizer(style, scale), decoded, stylized, stylize_workers),
+        stage(encode, stylized, None, encode_workers),
+    ]
+    for root, _, names in os.walk(source):
+        for name in names:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                source_path = os.path.join(root, name)
+                paths.put((source_path, os.path.join(target, os.path.relpath(source_path, source))))
+    paths.put(STOP)
+    for closer in stages:
+        closer.join()
+    elapsed = time.perf_counter() - start
+    print("Cartoonified {} images in {:.1f}s ({:.2f} images/s)".format(len(done), elapsed, len(done) / elapsed))
+
+
+def cartoonify_video(source, target, style="1", scale=1.0, stylize_workers=os.cpu_count() or 1, queue_size=16):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        print("Could not open", source)
+        return
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = cv2.VideoWriter(target, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    decoded, stylized = queue.Queue(queue_size), queue.Queue(queue_size)
+
+    ## Frames leave the stylize workers out of order, the single writer puts them back in order.
+    pending = {}
+    next_frame = [0]
+
+    def encode(item):
+        pending[item[0]] = item[1]
+        while next_frame[0] in pending:
+            writer.write(pending.pop(next_frame[0]))
+            next_frame[0] += 1
+
+    start = time.perf_counter()
+    stages = [
+        stage(make_stylizer(style, scale), decoded, stylized, stylize_workers),
+        stage(encode, stylized, None, 1),
+    ]
+    ## Decoding stays on this thread, a VideoCapture can only be read by one thread.
+    index = 0
+    while True:
+        grabbed, frame = capture.read()
+        if not grabbed:
+            break
+        decoded.put((index, frame))
+        index += 1
+    decoded.put(STOP)
+    for closer in stages:
+        closer.join()
+    ## Write whatever is left behind a frame that failed to stylize.
+    for frame in sorted(pending):
+        writer.write(pending[frame])
+    capture.release()
+    writer.release()
+    elapsed = time.perf_counter() - start
+    print("Cartoonified {} frames in {:.1f}s ({:.2f} frames/s)".format(next_frame[0], elapsed, next_frame[0] / elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cartoonify a folder of images or a video file without any window")
+    parser.add_argument("source", help="folder of images or video file")
+    parser.add_argument("target", help="output folder for a folder, output .mp4 file for a video")
+    parser.add_argument("--style", choices=sorted(STYLES), default="1")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="stylize at this fraction of the size and scale back up, e.g. 0.5 for about 4x speed")
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--stylize-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--encode-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=16, help="frames allowed to wait between two stages")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        cartoonify_folder(args.source, args.target, args.style, args.scale,
+                          (args.decode_workers, args.stylize_workers, args.encode_workers), args.queue_size)
+    else:
+        cartoonify_video(args.source, args.target, args.style, args.scale, args.stylize_workers, args.queue_size)
@@ -1,18 +1,17 @@
 import cv2
 import os
 from pathlib import Path
+from file_index import FileIndex
 
 image_name = input("Please enter the name of the image file that you want to process:    ") ## User input for the name of the image file.
 image_directory = input("Please enter the directory that may contain the image:    ") ## User input for the path of the image file.
 
 ## This function looks for and finds the desired file. You can specify a parent directory for the fundtion to look for, however if you have no idea where a file is; this functio will find it for you, just slower. If you have no idea where a file is, just type "/".
+## The file index remembers the directories it has seen, so only the first search of a tree is slow.
 def find_the_image(file_name, directory_name):
-    files_found = []
-    for path, subdirs, files in os.walk(directory_name):
-        for name in files:
-            if(file_name == name):
-                file_path = os.path.join(path,name)
-                files_found.append(file_path)
+    files_found = FileIndex().find(file_name, directory_name)
+    if not files_found:
+        raise SystemExit("Could not find " + file_name + " in " + directory_name)
 
     print(files_found[0])
     return files_found[0] ## Return the path.
@@ -23,7 +22,7 @@ new_working_directory = image_path.parent ## Initialize the parent directory of
 os.chdir(new_working_directory) ## Change the working directory of the script to the parent directory of the image path.
 
 
-color_image = cv2.imread(find_the_image(image_name, image_directory))
+color_image = cv2.imread(str(image_path))
 ##cv2.imshow("image_not_processed",color_image) ## Uncomment this to see the image without the process.
 ##cv2.waitKey()
 ##cv2.destroyAllWindows()
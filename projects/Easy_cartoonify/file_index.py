@@ -0,0 +1,86 @@
+import json
+import os
+from collections import defaultdict
+
+## Default place of the index, shared by every script that uses it.
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".file_index.json")
+
+
+## Remembers the listing of every directory it has walked, so finding a file by name does not walk the whole tree again.
+## A directory is only listed again when its modification time changed, which happens whenever a file is added, removed or renamed in it.
+class FileIndex:
+    def __init__(self, index_path=INDEX_PATH):
+        self.index_path = index_path
+        self.dirs = {}
+        try:
+            with open(index_path) as f:
+                self.dirs = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self._build_names()
+
+    def _build_names(self):
+        self.names = defaultdict(list)
+        for directory, entry in self.dirs.items():
+            for name in entry["files"]:
+                self.names[name].append(os.path.join(directory, name))
+
+    def refresh(self, root):
+        ## Walk root with scandir, relisting only the directories whose mtime changed.
+        root = os.path.abspath(root)
+        visited = set()
+        changed = False
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            visited.add(directory)
+            entry = self.dirs.get(directory)
+            if entry is None or entry["mtime"] != mtime:
+                files, subdirs = [], []
+                try:
+                    with os.scandir(directory) as entries:
+                        for item in entries:
+                            try:
+                                if item.is_dir(follow_symlinks=False):
+                                    subdirs.append(item.name)
+                                elif item.is_file():
+                                    files.append(item.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                entry = {"mtime": mtime, "files": files, "subdirs": subdirs}
+                self.dirs[directory] = entry
+                changed = True
+            stack.extend(os.path.join(directory, name) for name in entry["subdirs"])
+
+        ## Forget directories under root that no longer exist.
+        prefix = os.path.join(root, "")
+        for directory in list(self.dirs):
+            if (directory == root or directory.startswith(prefix)) and directory not in visited:
+                del self.dirs[directory]
+                changed = True
+        if changed:
+            self._build_names()
+            self.save()
+
+    def save(self):
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.dirs, f)
+        os.replace(temporary, self.index_path)
+
+    def find(self, file_name, directory_name):
+        ## Return every path of file_name under directory_name.
+        ## The stored index is tried first, the tree is only refreshed when it has no match that still exists.
+        root = os.path.join(os.path.abspath(directory_name), "")
+        found = [path for path in self.names.get(file_name, [])
+                 if path.startswith(root) and os.path.isfile(path)]
+        if not found:
+            self.refresh(directory_name)
+            found = [path for path in self.names.get(file_name, []) if path.startswith(root)]
+        return sorted(found)
@@ -1,45 +1,94 @@
+import argparse
 import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from PIL import Image
 
+@lru_cache(maxsize=None)
+def load_watermark(watermark_image_path):
+    return Image.open(watermark_image_path).convert("RGBA")
+
+@lru_cache(maxsize=64)
+def sized_watermark(watermark_image_path,newsize):
+    # photos from one camera share a size, so each worker resizes the watermark once per size
+    return load_watermark(watermark_image_path).resize(newsize)
+
 def watermark_photo(input_image_path,watermark_image_path,output_image_path):
+    start = time.perf_counter()
     base_image = Image.open(input_image_path)
-    watermark = Image.open(watermark_image_path).convert("RGBA")
+    image_mode = base_image.mode
     # add watermark to your image
     position = base_image.size
     newsize = (int(position[0]*8/100),int(position[0]*8/100))
-    # print(position)
-    watermark = watermark.resize(newsize)
-    # print(newsize)
-    # return watermark
+    watermark = sized_watermark(watermark_image_path,newsize)
 
+    new_position = position[0]-newsize[0]-20,position[1]-newsize[1]-20
+    if image_mode not in ('RGB','RGBA'):
+        base_image = base_image.convert('RGBA')
+    # paste the watermark straight into the photo, only its corner is touched
+    base_image.paste(watermark,new_position,watermark)
+    if image_mode != 'RGB':
+        base_image = base_image.convert('P')
+    base_image.save(output_image_path,optimize=True,quality=100)
+    print("Saving"+output_image_path+"...")
+    return time.perf_counter() - start
+
+def watermark_photo_full_canvas(input_image_path,watermark_image_path,output_image_path):
+    # the previous approach, kept to compare against in the benchmark
+    start = time.perf_counter()
+    base_image = Image.open(input_image_path)
+    watermark = Image.open(watermark_image_path).convert("RGBA")
+    position = base_image.size
+    newsize = (int(position[0]*8/100),int(position[0]*8/100))
+    watermark = watermark.resize(newsize)
     new_position = position[0]-newsize[0]-20,position[1]-newsize[1]-20
     # create a new transparent image
     transparent = Image.new(mode='RGBA',size=position,color=(0,0,0,0))
-    # paste the original image
     transparent.paste(base_image,(0,0))
-    # paste the watermark image
     transparent.paste(watermark,new_position,watermark)
-    image_mode = base_image.mode
-    print(image_mode)
-    if image_mode == 'RGB':
-        transparent = transparent.convert(image_mode)
+    if base_image.mode == 'RGB':
+        transparent = transparent.convert('RGB')
     else:
         transparent = transparent.convert('P')
     transparent.save(output_image_path,optimize=True,quality=100)
-    print("Saving"+output_image_path+"...")
+    return time.perf_counter() - start
 
-folder = input("Enter Folder Path:")
-watermark = input("Enter Watermark Path:")
-os.chdir(folder)
-files = os.listdir(os.getcwd())
-print(files)
+def list_photos(folder):
+    return [f for f in os.listdir(folder)
+            if os.path.isfile(os.path.join(folder,f)) and (f.endswith(".png") or f.endswith(".jpg"))]
 
-if not os.path.isdir("output"):
-    os.mkdir("output")
+def watermark_folder(folder,watermark,workers=None,method=watermark_photo):
+    files = list_photos(folder)
+    os.makedirs(os.path.join(folder,"output"),exist_ok=True)
+    inputs = [os.path.join(folder,f) for f in files]
+    outputs = [os.path.join(folder,"output",f) for f in files]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(method,inputs,[watermark]*len(files),outputs))
 
-c = 1
-for f in files:
-    if os.path.isfile(os.path.abspath(f)):
-        if f.endswith(".png") or f.endswith(".jpg"):
-            watermark_photo(f,watermark,"output/"+f)
+def report(name,latencies):
+    if not latencies:
+        print("{}: no png/jpg images found".format(name))
+        return
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies)-1,int(len(latencies)*0.95))]
+    print("{}: {} images, mean {:.1f} ms, median {:.1f} ms, p95 {:.1f} ms per image".format(
+        name,len(latencies),statistics.mean(latencies)*1000,statistics.median(latencies)*1000,p95*1000))
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add a watermark to every png/jpg image of a folder")
+    parser.add_argument("folder",nargs='?')
+    parser.add_argument("watermark",nargs='?')
+    parser.add_argument("--workers",type=int,default=None)
+    parser.add_argument("--benchmark",action="store_true",
+                        help="also time the previous full canvas method on the same folder")
+    args = parser.parse_args()
+
+    folder = args.folder or input("Enter Folder Path:")
+    watermark = args.watermark or input("Enter Watermark Path:")
+    if args.benchmark:
+        report("before (full canvas)",watermark_folder(folder,watermark,1,watermark_photo_full_canvas))
+        report("after (cached, direct paste)",watermark_folder(folder,watermark,1))
+    else:
+        report("watermarked",watermark_folder(folder,watermark,args.workers))
@@ -0,0 +1,174 @@
+# compress every image of a folder to a target file size or quality
+import argparse
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# import openCV library for image handling
+import cv2
+import numpy as np
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+QUALITY_FLAG = {'jpg': cv2.IMWRITE_JPEG_QUALITY, 'webp': cv2.IMWRITE_WEBP_QUALITY}
+
+
+class Reference:
+    # SSIM terms of the original image, computed once and reused by every probe
+    C1 = (0.01 * 255) ** 2
+    C2 = (0.03 * 255) ** 2
+
+    def __init__(self, img):
+        self.gray = self.prepare(img)
+        self.mu = self.blur(self.gray)
+        self.sigma = self.blur(self.gray * self.gray) - self.mu * self.mu
+
+    @staticmethod
+    def prepare(img):
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    @staticmethod
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    def ssim(self, img):
+        other = self.prepare(img)
+        mu = self.blur(other)
+        sigma = self.blur(other * other) - mu * mu
+        cross = self.blur(self.gray * other) - self.mu * mu
+        num = (2 * self.mu * mu + self.C1) * (2 * cross + self.C2)
+        den = (self.mu ** 2 + mu ** 2 + self.C1) * (self.sigma + sigma + self.C2)
+        return float((num / den).mean())
+
+
+def encode(img, fmt, quality):
+    ok, buf = cv2.imencode('.' + fmt, img, [QUALITY_FLAG[fmt], quality])
+    if not ok:
+        raise ValueError(f"could not encode as {fmt}")
+    return buf
+
+
+def search_quality(img, fmt, max_bytes=None, min_ssim=None):
+    '''
+    Binary search over quality 1-100 on the already decoded pixels.
+    With max_bytes the highest quality that fits is chosen, with min_ssim
+    the lowest quality that still looks close enough to the original.
+    Returns the encoded bytes, the quality and whether the target was met.
+    '''
+    reference = Reference(img) if min_ssim is not None else None
+    low, high = 1, 100
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        buf = encode(img, fmt, quality)
+        if max_bytes is not None:
+            ok = len(buf) <= max_bytes
+        else:
+            ok = reference.ssim(cv2.imdecode(buf, cv2.IMREAD_COLOR)) >= min_ssim
+        if ok:
+            best = (buf, quality)
+        # a good size target lets quality go up, a good SSIM lets it go down
+        if ok == (max_bytes is not None):
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        # target unreachable: smallest file for a size target, best quality for SSIM
+        quality = 1 if max_bytes is not None else 100
+        return encode(img, fmt, quality), quality, False
+    return best[0], best[1], True
+
+
+def keep_original(src, dst, start):
+    # copied under its own name and format, a PNG must not end up in a .jpg file
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    shutil.copyfile(src, dst)
+    size = os.path.getsize(src)
+    return src, (size, size, None, True, time.perf_counter() - start)
+
+
+def compress_file(src, dst, original_dst, fmt, max_bytes, min_ssim, scale):
+    '''
+    Writes the compressed image to dst, or copies the source to original_dst
+    when it already fits max_bytes or when compressing would not make it smaller.
+    '''
+    start = time.perf_counter()
+    size_in = os.path.getsize(src)
+    if max_bytes is not None and size_in <= max_bytes and scale >= 1:
+        return keep_original(src, original_dst, start)
+    img = cv2.imread(src, cv2.IMREAD_COLOR)
+    if img is None:
+        return src, None
+    if scale < 1:
+        size = (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    buf, quality, met = search_quality(img, fmt, max_bytes, min_ssim)
+    if len(buf) >= size_in:
+        return keep_original(src, original_dst, start)
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    with open(dst, 'wb') as f:
+        f.write(buf.tobytes())
+    return src, (size_in, len(buf), quality, met, time.perf_counter() - start)
+
+
+def output_names(root, names, fmt):
+    '''
+    Output name of every image of a folder: the name with the new format's
+    extension, or the full source name plus it when two sources share a stem
+    (a.jpg and a.png would both become a.jpg otherwise).
+    '''
+    stems = Counter(os.path.splitext(name)[0] for name in names)
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if stems[stem] > 1 and ext.lower().lstrip('.') != fmt:
+            yield name, name + '.' + fmt
+        else:
+            yield name, stem + '.' + fmt
+
+
+def compress_folder(src_dir, dst_dir, fmt='jpg', max_bytes=None, min_ssim=None, scale=1.0, workers=None):
+    jobs = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for root, _, names in os.walk(src_dir):
+            names = [name for name in names if name.lower().endswith(EXTENSIONS)]
+            out_dir = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+            for name, out_name in output_names(root, names, fmt):
+                jobs.append(pool.submit(compress_file, os.path.join(root, name), os.path.join(out_dir, out_name),
+                                        os.path.join(out_dir, name), fmt, max_bytes, min_ssim, scale))
+        before = after = done = kept = 0
+        for job in as_completed(jobs):
+            src, result = job.result()
+            if result is None:
+                print(f"{src}: could not read image")
+                continue
+            size_in, size_out, quality, met, seconds = result
+            before += size_in
+            after += size_out
+            done += 1
+            if quality is None:
+                kept += 1
+                print(f"{src}: {size_in} bytes, original kept in {seconds:.2f}s")
+                continue
+            note = '' if met else ' (target not reached)'
+            print(f"{src}: {size_in} -> {size_out} bytes at quality {quality} in {seconds:.2f}s{note}")
+    elapsed = time.perf_counter() - start
+    print(f"{done} images ({kept} kept as they were), {before} -> {after} bytes, saved {before - after} bytes "
+          f"({100 * (before - after) / max(before, 1):.1f}%), {done / elapsed:.1f} images/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compress a folder of images to a target size or SSIM")
+    parser.add_argument("input", help="folder of images to compress")
+    parser.add_argument("output", help="folder for the compressed images, the layout of input is kept")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--max-kb", type=float, help="largest allowed file size in KB")
+    target.add_argument("--min-ssim", type=float, help="lowest allowed SSIM to the original, e.g. 0.95")
+    parser.add_argument("--format", choices=sorted(QUALITY_FLAG), default='jpg')
+    parser.add_argument("--scale", type=float, default=1.0, help="resize ratio applied before compressing")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_kb * 1024) if args.max_kb is not None else None
+    compress_folder(args.input, args.output, args.format, max_bytes, args.min_ssim, args.scale, args.workers)
@@ -1,21 +1,51 @@
-import sys
+import argparse
+import csv
 import os
 import shutil
-import pandas as pd
+import zlib
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, the open files limit is not checked there
+    resource = None
+
+# write buffer of every partition in key mode, all of them are open at once
+PARTITION_BUFFER = 64 << 10
+# descriptors left over for the input file and the interpreter itself
+RESERVED_FILES = 16
+
 
 class Split_Files:
     '''
         Class file for split file program
     '''
-    def __init__(self, filename, split_number):
+    def __init__(self, filename, split_number, mode='lines', header=None, key=None):
         '''
-            Getting the file name and the split index
+            Getting the file name, the split mode and its value
             Initializing the output directory, if present then truncate it.
             Getting the file extension
+
+            mode is one of
+                lines - split_number rows per output file
+                bytes - roughly split_number bytes per output file
+                parts - split_number output files of roughly equal size
+                key   - split_number output files, rows with the same value
+                        in the key column always go to the same file
+            header defaults to True for csv files, so the first row is
+            repeated at the top of every part.
         '''
         self.file_name = filename
         self.directory = "file_split"
         self.split = int(split_number)
+        self.mode = mode
+        if self.split < 1:
+            raise ValueError("split number must be a positive integer")
+        if self.mode not in ('lines', 'bytes', 'parts', 'key'):
+            raise ValueError(f"unknown split mode: {self.mode}")
+        if self.mode == 'key' and key is None:
+            raise ValueError("key mode needs a key column")
+        self.key = key
         if os.path.exists(self.directory):
             shutil.rmtree(self.directory)
         os.mkdir(self.directory)
@@ -23,33 +53,151 @@ class Split_Files:
             self.file_extension = '.txt'
         else:
             self.file_extension = '.csv'
+        if header is None:
+            header = self.file_extension == '.csv'
+        self.header = header
         self.file_number = 1
 
+    def records(self, source):
+        '''
+            Yielding the raw bytes of every row of the opened file.
+            For csv files a quoted field may contain line breaks, so lines
+            are joined until the quote characters are balanced again.
+        '''
+        if self.file_extension != '.csv':
+            yield from source
+            return
+        pending = b''
+        for line in source:
+            pending += line
+            if pending.count(b'"') % 2 == 0:
+                yield pending
+                pending = b''
+        if pending:
+            yield pending
+
+    def output_name(self, number=None):
+        number = self.file_number if number is None else number
+        return f"{self.directory}/split_file{number}{self.file_extension}"
+
+    def check_open_files(self):
+        '''
+            Making sure every partition can be open at the same time,
+            raising the soft limit up to the hard one when needed
+        '''
+        if resource is None:
+            return
+        needed = self.split + RESERVED_FILES
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft == resource.RLIM_INFINITY or needed <= soft:
+            return
+        if hard == resource.RLIM_INFINITY or needed <= hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+            return
+        raise ValueError(f"{self.split} partitions need {needed} open files but the limit is {hard}, "
+                         f"use fewer partitions or raise it with ulimit -n")
+
+    def key_index(self, header):
+        '''
+            Getting the position of the key column, either by its name in
+            the header row or as a zero based column number
+        '''
+        if header:
+            names = self.fields(header)
+            if self.key in names:
+                return names.index(self.key)
+        try:
+            return int(self.key)
+        except ValueError:
+            raise ValueError(f"no column named {self.key}") from None
+
+    def fields(self, row):
+        text = row.decode('utf-8', errors='replace')
+        if self.file_extension == '.txt':
+            return text.split()
+        return next(csv.reader([text]), [])
+
     def split_data(self):
         '''
-            spliting the input csv/txt file according to the index provided
+            spliting the input csv/txt file according to the mode provided,
+            streaming rows straight into rotating output files
         '''
-        data = pd.read_csv(self.file_name, header=None)
-        data.index += 1
+        if self.mode == 'key':
+            return self.split_by_key()
+        with open(self.file_name, 'rb') as source:
+            # the file size is only needed to place the part boundaries
+            source.seek(0, os.SEEK_END)
+            size = source.tell()
+            source.seek(0)
+
+            rows = self.records(source)
+            header = next(rows, b'') if self.header else b''
+            body_start = len(header)
+            part_size = (size - body_start) / self.split
 
-        split_frame = pd.DataFrame()
-        output_file = f"{self.directory}/split_file{self.file_number}{self.file_extension}"
+            output = None
+            count = written = 0
+            for row in rows:
+                if output is None:
+                    output = open(self.output_name(), 'wb')
+                    output.write(header)
+                output.write(row)
+                count += 1
+                written += len(row)
 
-        for i in range(1, len(data)+1):
-            split_frame = split_frame.append(data.iloc[i-1])
-            if i % self.split == 0:
-                output_file = f"{self.directory}/split_file{self.file_number}{self.file_extension}"
-                if self.file_extension == '.txt':
-                    split_frame.to_csv(output_file, header=False, index=False, sep=' ')
+                if self.mode == 'lines':
+                    full = count >= self.split
+                elif self.mode == 'bytes':
+                    full = written >= self.split
                 else:
-                    split_frame.to_csv(output_file, header=False, index=False)
-                split_frame.drop(split_frame.index, inplace=True)
-                self.file_number += 1
-        if not split_frame.empty:
-            output_file = f"{self.directory}/split_file{self.file_number}{self.file_extension}"
-            split_frame.to_csv(output_file, header=False, index=False)
+                    # the last part takes whatever is left
+                    boundary = body_start + part_size * self.file_number
+                    full = self.file_number < self.split and source.tell() >= boundary
+                if full:
+                    output.close()
+                    output = None
+                    count = written = 0
+                    self.file_number += 1
+            if output is not None:
+                output.close()
+
+    def split_by_key(self):
+        '''
+            partitioning the input file on the key column in a single pass.
+            crc32 of the key is used instead of hash() as it does not change
+            between runs, so a key always lands in the same partition.
+        '''
+        with open(self.file_name, 'rb') as source:
+            rows = self.records(source)
+            header = next(rows, b'') if self.header else b''
+            column = self.key_index(header)
+
+            self.check_open_files()
+            outputs = []
+            try:
+                for number in range(1, self.split + 1):
+                    output = open(self.output_name(number), 'wb', buffering=PARTITION_BUFFER)
+                    outputs.append(output)
+                    output.write(header)
+                for row in rows:
+                    values = self.fields(row)
+                    value = values[column] if column < len(values) else ''
+                    partition = zlib.crc32(value.encode('utf-8')) % self.split
+                    outputs[partition].write(row)
+            finally:
+                for output in outputs:
+                    output.close()
+
 
 if __name__ == '__main__':
-    file, split_number = sys.argv[1], sys.argv[2]
-    sp = Split_Files(file, split_number)
+    parser = argparse.ArgumentParser(description="Split a csv/txt file into smaller files")
+    parser.add_argument("file", help="csv or txt file to split")
+    parser.add_argument("split_number",
+                        help="rows per file, bytes per file or number of parts, depending on --mode")
+    parser.add_argument("--mode", choices=['lines', 'bytes', 'parts', 'key'], default='lines')
+    parser.add_argument("--key", help="column name or number to partition on in key mode")
+    parser.add_argument("--no-header", dest="header", action="store_false", default=None,
+                        help="do not repeat the first csv row in every part")
+    args = parser.parse_args()
+    sp = Split_Files(args.file, args.split_number, args.mode, args.header, args.key)
     sp.split_data()
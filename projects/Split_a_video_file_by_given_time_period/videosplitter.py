@@ -1,24 +1,87 @@
 import ffmpeg
 import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 
-parser = argparse.ArgumentParser(description='''Split A media file
-                                            into two chunks''')
-parser.add_argument('inputfile', help="Input filename")
-parser.add_argument('starttime', type=float, help="Start time in seconds")
-parser.add_argument('endtime', type=float, help="End time in seconds")
-parser.add_argument('outputfile1', help="Output filename")
-parser.add_argument('outputfile2', help="Output filename")
+def output_pattern(inputfile, output_dir=None):
+    '''Numbered names for the parts, e.g. test_000.mp4, test_001.mp4 ...'''
+    base, ext = os.path.splitext(os.path.basename(inputfile))
+    return os.path.join(output_dir or os.path.dirname(inputfile), base + '_%03d' + ext)
 
-args = parser.parse_args()
 
-in1 = ffmpeg.input(args.inputfile)
+def segment(inputfile, every=None, at=None, precise=False, output_dir=None):
+    '''
+    Cut inputfile into parts in a single ffmpeg run, either every `every`
+    seconds or at the list of times `at`.
+    By default the streams are copied without re-encoding, so the cuts land
+    on the nearest keyframe. precise re-encodes with keyframes forced at the
+    cut times, so every part starts at exactly the requested time.
+    '''
+    options = {'f': 'segment', 'map': '0', 'reset_timestamps': 1}
+    if every is not None:
+        options['segment_time'] = every
+    else:
+        options['segment_times'] = ','.join(str(t) for t in at)
+    if precise:
+        if every is not None:
+            options['force_key_frames'] = 'expr:gte(t,n_forced*{})'.format(every)
+        else:
+            options['force_key_frames'] = ','.join(str(t) for t in at)
+    else:
+        options['c'] = 'copy'
 
-v1 = in1.filter('trim', start=float(args.starttime), end=(args.endtime))
-v2 = in1.filter('trim', start=float(args.endtime))
+    pattern = output_pattern(inputfile, output_dir)
+    # stderr is captured, so ffmpeg must never stop to ask about existing parts:
+    # they are overwritten and stdin is not read at all
+    (ffmpeg.input(inputfile).output(pattern, **options)
+     .overwrite_output().global_args('-nostdin').run(quiet=True))
+    return pattern
 
-out1 = ffmpeg.output(v1, args.outputfile1)
-out2 = ffmpeg.output(v2, args.outputfile2)
 
-out1.run()
-out2.run()
+def split_two(inputfile, starttime, endtime, outputfile1, outputfile2):
+    '''The original two part split, now both outputs come from one ffmpeg run.'''
+    in1 = ffmpeg.input(inputfile)
+
+    v1 = in1.filter('trim', start=float(starttime), end=(endtime))
+    v2 = in1.filter('trim', start=float(endtime))
+
+    out1 = ffmpeg.output(v1, outputfile1)
+    out2 = ffmpeg.output(v2, outputfile2)
+
+    ffmpeg.merge_outputs(out1, out2).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='''Split A media file
+                                                into two chunks, or several
+                                                files into any number of parts''')
+    parser.add_argument('inputs', nargs='+',
+                        help="inputfile starttime endtime outputfile1 outputfile2, "
+                             "or one or more input files with --every/--at")
+    parser.add_argument('--every', type=float, help="Cut a part every this many seconds")
+    parser.add_argument('--at', type=float, nargs='+', help="Cut at these times in seconds")
+    parser.add_argument('--precise', action='store_true',
+                        help="Re-encode so parts start exactly at the cut times instead of the nearest keyframe")
+    parser.add_argument('--output-dir', help="Directory for the parts, defaults to next to each input")
+    parser.add_argument('--jobs', type=int, default=2, help="Input files processed at the same time")
+
+    args = parser.parse_args()
+
+    if args.every is None and args.at is None:
+        if len(args.inputs) != 5:
+            parser.error("give inputfile starttime endtime outputfile1 outputfile2, or use --every/--at")
+        inputfile, starttime, endtime, outputfile1, outputfile2 = args.inputs
+        split_two(inputfile, float(starttime), float(endtime), outputfile1, outputfile2)
+    else:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        # each file is its own ffmpeg process, threads only wait on them
+        with ThreadPoolExecutor(args.jobs) as pool:
+            jobs = {pool.submit(segment, inputfile, args.every, args.at, args.precise, args.output_dir): inputfile
+                    for inputfile in args.inputs}
+            for job in jobs:
+                try:
+                    print("{} -> {}".format(jobs[job], job.result()))
+                except ffmpeg.Error as error:
+                    print("{} failed: {}".format(jobs[job], error.stderr.decode(errors='replace') if error.stderr else error))
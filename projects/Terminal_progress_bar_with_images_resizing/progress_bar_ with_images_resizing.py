@@ -1,30 +1,120 @@
 from tqdm import tqdm
 from PIL import Image
+import json
 import os
-from time import sleep
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+# remembers which source file and size every thumbnail was made from
+MANIFEST = "manifest.json"
 
-def Resize_image(size, image):
-    if os.path.isfile(image):
+
+def Resize_image(size, image, path, draft=True):
+    source = os.path.join(path, image)
+    if os.path.isfile(source):
         try:
-            im = Image.open(image)
-            im.thumbnail(size, Image.ANTIALIAS)
-            im.save("resize/" + str(image) + ".jpg")
+            im = Image.open(source)
+            if draft:
+                # let the JPEG decoder scale down by up to 1/8 in the DCT domain
+                # instead of decoding every pixel, thumbnail does the rest
+                im.draft("RGB", size)
+            im.thumbnail(size, Image.LANCZOS)
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            im.save(os.path.join(path, "resize", str(image) + ".jpg"))
         except Exception as ex:
-            print(f"Error: {str(ex)} to {image}")
+            return f"Error: {str(ex)} to {image}"
+
+
+def Load_manifest(path):
+    try:
+        with open(os.path.join(path, "resize", MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def Save_manifest(path, manifest):
+    target = os.path.join(path, "resize", MANIFEST)
+    with open(target + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(target + ".tmp", target)
+
+
+def Manifest_entry(size, image, path):
+    stat = os.stat(os.path.join(path, image))
+    return {
+        "mtime": stat.st_mtime_ns,
+        "bytes": stat.st_size,
+        "size": list(size),
+        "output": os.path.join("resize", str(image) + ".jpg"),
+    }
+
+
+def Resize_folder(size, path, list_images, workers=None, incremental=True):
+    manifest = Load_manifest(path) if incremental else {}
+    stale = {}
+    skipped = 0
+    for image in list_images:
+        if not os.path.isfile(os.path.join(path, image)):
+            continue
+        entry = Manifest_entry(size, image, path)
+        # skip thumbnails made from this exact file at this size that are still there
+        if manifest.get(image) == entry and os.path.isfile(os.path.join(path, entry["output"])):
+            skipped += 1
+            continue
+        stale[image] = entry
+    if skipped:
+        print(f"Skipping {skipped} up to date images")
+
+    errors = []
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = {pool.submit(Resize_image, size, image, path): image for image in stale}
+        for job in tqdm(as_completed(jobs), total=len(jobs), desc="Resizing Images"):
+            error = job.result()
+            if error:
+                errors.append(error)
+                tqdm.write(error)
+            else:
+                manifest[jobs[job]] = stale[jobs[job]]
+    if incremental:
+        Save_manifest(path, manifest)
+    return errors
+
+
+def Benchmark(path, size=(256, 256), baseline_sample=200):
+    list_images = [image for image in os.listdir(path) if os.path.isfile(os.path.join(path, image))]
+    os.makedirs(os.path.join(path, "resize"), exist_ok=True)
+
+    # the old way: one image at a time, decoding it completely
+    sample = list_images[:baseline_sample]
+    start = time.perf_counter()
+    for image in sample:
+        Resize_image(size, image, path, draft=False)
+    serial = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    Resize_folder(size, path, list_images, incremental=False)
+    parallel = len(list_images) / (time.perf_counter() - start)
+
+    print(f"Serial, full decode: {serial:.1f} images/s ({len(sample)} images)")
+    print(f"Parallel, draft:     {parallel:.1f} images/s ({len(list_images)} images)")
+    print(f"Speedup: {parallel / serial:.1f}x")
 
 
-path = input("Enter Path to images : ")
-size = input("Size Height , Width : ")
-size = tuple(map(int, size.split(",")))
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        Benchmark(sys.argv[2])
+        sys.exit()
 
-os.chdir(path)
+    path = input("Enter Path to images : ")
+    size = input("Size Height , Width : ")
+    size = tuple(map(int, size.split(",")))
 
-list_images = os.listdir(path)
-if "resize" not in list_images:
-    os.mkdir("resize")
+    list_images = os.listdir(path)
+    if "resize" not in list_images:
+        os.mkdir(os.path.join(path, "resize"))
 
-for image in tqdm(list_images, desc="Resizing Images"):
-    Resize_image(size, image)
-    sleep(0.1)
-print("Resizing Completed!")
+    Resize_folder(size, path, list_images)
+    print("Resizing Completed!")
@@ -0,0 +1,101 @@
+from PIL import Image
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# format name: (Pillow format, file extensions)
+FORMATS = {
+  'jpg': ('JPEG', ('.jpg', '.jpeg')),
+  'png': ('PNG', ('.png',)),
+  'ico': ('ICO', ('.ico',)),
+  'webp': ('WEBP', ('.webp',)),
+  'bmp': ('BMP', ('.bmp',)),
+  'gif': ('GIF', ('.gif',)),
+  'tiff': ('TIFF', ('.tif', '.tiff')),
+}
+# formats that can't store an alpha channel
+NO_ALPHA = ('JPEG', 'BMP')
+
+
+def find_images(src_dir, extensions):
+  # walk the tree lazily so conversion starts before the whole tree is listed
+  with os.scandir(src_dir) as entries:
+    for entry in entries:
+      if entry.is_dir(follow_symlinks=False):
+        yield from find_images(entry.path, extensions)
+      elif entry.is_file() and entry.name.lower().endswith(extensions):
+        yield entry.path
+
+
+def output_path(src, src_dir, dst_dir, target):
+  rel = os.path.relpath(src, src_dir)
+  return os.path.join(dst_dir, os.path.splitext(rel)[0] + FORMATS[target][1][0])
+
+
+def is_current(src, dst):
+  try:
+    return os.path.getmtime(dst) >= os.path.getmtime(src)
+  except OSError:
+    return False
+
+
+def convert_image(src, dst, target):
+  pil_format = FORMATS[target][0]
+  try:
+    im = Image.open(src)
+    if pil_format in NO_ALPHA:
+      im = im.convert("RGB")
+    elif im.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+      im = im.convert("RGBA")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # write next to the output and rename, so a half written file never looks current
+    tmp = dst + '.part'
+    im.save(tmp, pil_format)
+    os.replace(tmp, dst)
+  except (IOError, ValueError) as ex:
+    return f'{src}: {ex}'
+
+
+def convert_tree(src_dir, dst_dir, sources, target, workers=None, force=False):
+  extensions = tuple(ext for fmt in sources for ext in FORMATS[fmt][1])
+  workers = workers or os.cpu_count()
+  skipped = 0
+  results = []
+  start = time.time()
+  with ProcessPoolExecutor(workers) as pool:
+    pending = set()
+    for src in find_images(src_dir, extensions):
+      dst = output_path(src, src_dir, dst_dir, target)
+      if not force and is_current(src, dst):
+        skipped += 1
+        continue
+      pending.add(pool.submit(convert_image, src, dst, target))
+      # keep only a few jobs queued per worker, the tree may be huge
+      if len(pending) >= workers * 4:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        results.extend(job.result() for job in done)
+    results.extend(job.result() for job in pending)
+  converted = results.count(None)
+  errors = [error for error in results if error]
+  for error in errors:
+    print(error)
+  print(f'converted {converted}, skipped {skipped} up to date, failed {len(errors)} '
+        f'in {time.time() - start:.1f}s')
+  return errors
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Convert every image of a directory tree to another format')
+  parser.add_argument('src', help='directory to read images from, sub-directories included')
+  parser.add_argument('dst', help='directory to write converted images to, same layout as src')
+  parser.add_argument('--from', dest='sources', nargs='+', choices=sorted(FORMATS), required=True)
+  parser.add_argument('--to', dest='target', choices=sorted(FORMATS), required=True)
+  parser.add_argument('--workers', type=int, default=None)
+  parser.add_argument('--force', action='store_true', help='convert even if the output is up to date')
+  args = parser.parse_args()
+  if not os.path.isdir(args.src):
+    print('directory not found!')
+    sys.exit()
+  convert_tree(args.src, args.dst, args.sources, args.target, args.workers, args.force)
@@ -5,13 +5,14 @@ import os
 try:
   im = None
   for root, dirs, files in os.walk("."):
-    for filename in files:
+    for name in files:
+        filename = os.path.join(root, name)
         if filename.endswith('.jpg'):
           im = Image.open(filename).convert("RGB")
-          im.save(filename.replace('jpg', 'png'), "png")
+          im.save(os.path.splitext(filename)[0] + '.png', "png")
         elif filename.endswith('.png'):
           im = Image.open(filename).convert("RGB")
-          im.save(filename.replace('png', 'jpg'), "jpeg")
+          im.save(os.path.splitext(filename)[0] + '.jpg', "jpeg")
         else:
           print('dont have image to convert')
 except IOError:
@@ -4,59 +4,222 @@
 #
 
 
+import argparse
 import numpy as np
+import os
 import os.path as osp
-import sys
+import time
 import cv2
 import dlib
+from concurrent.futures import ProcessPoolExecutor
 
 OUT_SIZE = (224, 224)
 LEFT_EYE_RANGE = (36, 42)
 RIGHT_EYE_RABGE = (42, 48)
 LEFT_EYE_POS = (0.35, 0.3815)
 DAT_PATH = "./dat/shape_predictor_68_face_landmarks.dat"
+# Images wider than this are shrunk before detection, landmarks and
+# alignment still use the full resolution image
+DETECT_WIDTH = 800
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+# A tracked face is dropped when the tracker's confidence falls below this,
+# until the next detection finds it again
+TRACK_QUALITY = 7
 
+# Loaded once per worker process by init_worker
+_detector = None
+_sp = None
 
-def main(files):
+
+def main(files, dat_path=DAT_PATH, detect_width=DETECT_WIDTH, upsample=1):
     detector = dlib.get_frontal_face_detector()
-    sp = dlib.shape_predictor(DAT_PATH)
+    sp = dlib.shape_predictor(dat_path)
 
     for file in files:
-        img = cv2.imread(file, cv2.IMREAD_ANYCOLOR)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-        faces = detect_align_faces(detector, sp, img)
-        for (idx, face) in enumerate(faces):
-            face = cv2.cvtColor(face, cv2.COLOR_RGB2BGR)
-            filename, ext = osp.splitext(file)
-            filename += '_face_{:03}'.format(idx) + ext
-            cv2.imwrite(filename, face)
-
-
-def detect_align_faces(detector, sp, img):
-    faces = detector(img, 1)
-    res = []
-    for face in faces:
-        shape = sp(img, face)
-        left, right = shape_to_pos(shape)
-        left_center = np.mean(left, axis=0)
-        right_center = np.mean(right, axis=0)
-
-        dx = right_center[0] - left_center[0]
-        dy = right_center[1] - left_center[1]
-        angle = np.degrees(np.arctan2(dy, dx))
-        dist = np.sqrt(dy ** 2 + dx ** 2)
-        out_dist = OUT_SIZE[0] * (1 - 2 * LEFT_EYE_POS[0])
-        scale = out_dist / dist
-        center = ((left_center + right_center) // 2).tolist()
-
-        mat = cv2.getRotationMatrix2D(center, angle, scale)
-        mat[0, 2] += (0.5 * OUT_SIZE[0] - center[0])
-        mat[1, 2] += (LEFT_EYE_POS[1] * OUT_SIZE[1] - center[1])
-        res_face = cv2.warpAffine(img, mat, OUT_SIZE, flags=cv2.INTER_CUBIC)
-        res.append(res_face)
-
-    return res
+        faces = align_file(detector, sp, file, detect_width, upsample)
+        if faces is None:
+            print("Could not read {}".format(file))
+        save_faces(file, faces)
+
+
+def init_worker(dat_path):
+    global _detector, _sp
+    _detector = dlib.get_frontal_face_detector()
+    _sp = dlib.shape_predictor(dat_path)
+
+
+def worker_align(file, detect_width, upsample, write):
+    faces = align_file(_detector, _sp, file, detect_width, upsample)
+    if faces is None:
+        return None
+    if write:
+        save_faces(file, faces)
+    return len(faces)
+
+
+def batch(files, dat_path=DAT_PATH, jobs=None, detect_width=DETECT_WIDTH,
+          upsample=1, write=True):
+    """Align the faces of every file in a pool of processes.
+    Returns the number of faces found and the seconds it took."""
+    start = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(jobs, initializer=init_worker,
+                             initargs=(dat_path,)) as pool:
+        counts = pool.map(worker_align, files,
+                          [detect_width] * len(files),
+                          [upsample] * len(files),
+                          [write] * len(files),
+                          chunksize=4)
+        for file, count in zip(files, counts):
+            if count is None:
+                print("Could not read {}".format(file))
+            else:
+                total += count
+    return total, time.perf_counter() - start
+
+
+def benchmark(files, dat_path=DAT_PATH, jobs=None, detect_width=DETECT_WIDTH,
+              upsample=1):
+    """Compare the original serial full resolution detection with the
+    downscaled detection in a pool, without writing any faces."""
+    detector = dlib.get_frontal_face_detector()
+    sp = dlib.shape_predictor(dat_path)
+    start = time.perf_counter()
+    serial = 0
+    for file in files:
+        serial += len(align_file(detector, sp, file, None, 1) or [])
+    runs = [("serial, full resolution", serial, time.perf_counter() - start)]
+
+    faces, seconds = batch(files, dat_path, jobs, detect_width, upsample,
+                           write=False)
+    runs.append(("{} jobs, detect at {}px".format(jobs, detect_width),
+                 faces, seconds))
+
+    print("{} images".format(len(files)))
+    for name, faces, seconds in runs:
+        print("{:>32}: {} faces in {:.2f}s, {:.2f} faces/s, {:.2f} images/s"
+              .format(name, faces, seconds, faces / seconds,
+                      len(files) / seconds))
+
+
+def align_video(source, dat_path=DAT_PATH, every=10, detect_width=DETECT_WIDTH,
+                upsample=1, output=None):
+    """Align the faces of a video file or capture device, detecting faces
+    every `every` frames and following them with a correlation tracker in
+    between. Landmarks are only found inside the tracked boxes."""
+    detector = dlib.get_frontal_face_detector()
+    sp = dlib.shape_predictor(dat_path)
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        print("Could not open {}".format(source))
+        return
+    if output:
+        os.makedirs(output, exist_ok=True)
+
+    trackers = []
+    frames = detected = tracked = aligned = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if frames % every == 0:
+                boxes = detect_faces(detector, img, detect_width, upsample)
+                trackers = []
+                for box in boxes:
+                    tracker = dlib.correlation_tracker()
+                    tracker.start_track(img, box)
+                    trackers.append(tracker)
+                detected += 1
+            else:
+                trackers = [tracker for tracker in trackers
+                            if tracker.update(img) >= TRACK_QUALITY]
+                boxes = [rounded(tracker.get_position()) for tracker in trackers]
+                tracked += 1
+
+            for (idx, box) in enumerate(boxes):
+                face = align_face(sp, img, box)
+                aligned += 1
+                if output:
+                    cv2.imwrite(osp.join(output, 'frame_{:06}_face_{:03}.jpg'.format(frames, idx)),
+                                cv2.cvtColor(face, cv2.COLOR_RGB2BGR))
+            frames += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+
+    seconds = time.perf_counter() - start
+    if frames:
+        print("{} frames in {:.2f}s ({:.2f} fps), {} faces aligned".format(
+            frames, seconds, frames / seconds, aligned))
+        print("{} detected frames, {} tracked frames ({:.1f} tracked per detection)".format(
+            detected, tracked, tracked / max(detected, 1)))
+
+
+def rounded(rect):
+    return dlib.rectangle(int(round(rect.left())), int(round(rect.top())),
+                          int(round(rect.right())), int(round(rect.bottom())))
+
+
+def align_file(detector, sp, file, detect_width=None, upsample=1):
+    img = cv2.imread(file, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return detect_align_faces(detector, sp, img, detect_width, upsample)
+
+
+def save_faces(file, faces):
+    for (idx, face) in enumerate(faces or []):
+        face = cv2.cvtColor(face, cv2.COLOR_RGB2BGR)
+        filename, ext = osp.splitext(file)
+        filename += '_face_{:03}'.format(idx) + ext
+        cv2.imwrite(filename, face)
+
+
+def detect_faces(detector, img, detect_width=None, upsample=1):
+    """Run the detector on a copy at most detect_width wide and return the
+    boxes in full resolution coordinates."""
+    height, width = img.shape[:2]
+    if not detect_width or width <= detect_width:
+        return list(detector(img, upsample))
+
+    factor = detect_width / width
+    small = cv2.resize(img, (detect_width, max(1, round(height * factor))),
+                       interpolation=cv2.INTER_AREA)
+    return [dlib.rectangle(int(face.left() / factor),
+                           int(face.top() / factor),
+                           int(face.right() / factor),
+                           int(face.bottom() / factor))
+            for face in detector(small, upsample)]
+
+
+def detect_align_faces(detector, sp, img, detect_width=None, upsample=1):
+    return [align_face(sp, img, face)
+            for face in detect_faces(detector, img, detect_width, upsample)]
+
+
+def align_face(sp, img, face):
+    shape = sp(img, face)
+    left, right = shape_to_pos(shape)
+    left_center = np.mean(left, axis=0)
+    right_center = np.mean(right, axis=0)
+
+    dx = right_center[0] - left_center[0]
+    dy = right_center[1] - left_center[1]
+    angle = np.degrees(np.arctan2(dy, dx))
+    dist = np.sqrt(dy ** 2 + dx ** 2)
+    out_dist = OUT_SIZE[0] * (1 - 2 * LEFT_EYE_POS[0])
+    scale = out_dist / dist
+    center = ((left_center + right_center) // 2).tolist()
+
+    mat = cv2.getRotationMatrix2D(center, angle, scale)
+    mat[0, 2] += (0.5 * OUT_SIZE[0] - center[0])
+    mat[1, 2] += (LEFT_EYE_POS[1] * OUT_SIZE[1] - center[1])
+    return cv2.warpAffine(img, mat, OUT_SIZE, flags=cv2.INTER_CUBIC)
 
 
 def shape_to_pos(shape):
@@ -70,5 +233,54 @@ def shape_to_pos(shape):
     return (np.array(left), np.array(right))
 
 
+def expand(paths):
+    """Pictures given directly, plus the pictures inside given folders,
+    leaving out the faces written by an earlier run."""
+    files = []
+    for path in paths:
+        if not osp.isdir(path):
+            files.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            stem, ext = osp.splitext(name)
+            if ext.lower() in IMAGE_EXTS and '_face_' not in stem:
+                files.append(osp.join(path, name))
+    return files
+
+
 if __name__ == '__main__':
-    main(sys.argv[1:])
+    parser = argparse.ArgumentParser(description="Detect and align faces")
+    parser.add_argument('files', nargs='*', help="pictures or folders of pictures")
+    parser.add_argument('--video', help="video file or capture device number (e.g. 0 for the webcam)")
+    parser.add_argument('--every', type=int, default=10,
+                        help="in video mode, detect faces every this many frames and track them in between")
+    parser.add_argument('--output', help="in video mode, folder to write the aligned faces to")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help="processes aligning pictures at the same time")
+    parser.add_argument('--detect-width', type=int, default=DETECT_WIDTH,
+                        help="detect faces on a copy at most this wide, "
+                             "0 detects at full resolution")
+    parser.add_argument('--upsample', type=int, default=1,
+                        help="times the detector upsamples the picture to find small faces")
+    parser.add_argument('--dat', default=DAT_PATH, help="shape predictor model")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="report faces per second without writing faces")
+    args = parser.parse_args()
+
+    if args.video is not None:
+        align_video(args.video, args.dat, max(1, args.every), args.detect_width,
+                    args.upsample, args.output)
+        raise SystemExit
+    if not args.files:
+        parser.error("give pictures or folders, or --video")
+
+    files = expand(args.files)
+    if args.benchmark:
+        benchmark(files, args.dat, args.jobs, args.detect_width, args.upsample)
+    elif args.jobs == 1:
+        main(files, args.dat, args.detect_width, args.upsample)
+    else:
+        faces, seconds = batch(files, args.dat, args.jobs, args.detect_width,
+                               args.upsample)
+        print("{} faces from {} pictures in {:.2f}s ({:.2f} faces/s)".format(
+            faces, len(files), seconds, faces / seconds))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+#
+# Embed or extract a payload across every image of a directory.
+#
+# A payload bigger than one image is cut into chunks, each chunk carries
+# a sequence header so the pieces can be put back in order on extraction.
+
+import argparse
+import os
+import os.path as osp
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import dct
+import lsb
+
+METHODS = {'lsb': lsb, 'dct': dct}
+# lsb output has to be lossless, dct survives jpg compression
+SUFFIX = {'lsb': '.png', 'dct': '.jpg'}
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+MAGIC = b'STEG'
+HEADER = struct.Struct('>4sII')
+
+
+# Read (height, width, channels) from the file header without decoding pixels
+def image_shape(path):
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            width, height, _, color = struct.unpack('>IIBB', head[16:26])
+            # cv2 drops alpha and expands palettes when reading ANYCOLOR
+            return height, width, 1 if color in (0, 4) else 3
+        if head[:2] == b'\xff\xd8':
+            f.seek(2)
+            while True:
+                byte = f.read(1)
+                if not byte:
+                    break
+                if byte != b'\xff':
+                    continue
+                marker = f.read(1)
+                while marker == b'\xff':
+                    marker = f.read(1)
+                if not marker or marker in (b'\x01', b'\xd8') or b'\xd0' <= marker <= b'\xd7':
+                    continue
+                length = struct.unpack('>H', f.read(2))[0]
+                # start of frame markers, except DHT, JPG and DAC
+                if b'\xc0' <= marker <= b'\xcf' and marker not in (b'\xc4', b'\xc8', b'\xcc'):
+                    _, height, width, channels = struct.unpack('>BHHB', f.read(6))
+                    return height, width, 1 if channels == 1 else 3
+                f.seek(length - 2, os.SEEK_CUR)
+    # Unknown format, fall back to decoding it
+    img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        raise ValueError('cannot read image')
+    return img.shape
+
+
+# Payload bytes an image can hold once the length and sequence headers are added,
+# 0 for an image that cannot be read so it is left out of the plan
+def usable_bytes(method, path):
+    try:
+        max_bytes = METHODS[method].capacity(image_shape(path))
+    except (OSError, ValueError, struct.error) as error:
+        print('{}: skipped, {}'.format(osp.basename(path), error))
+        return 0
+    return max(0, max_bytes - len(str(max_bytes)) - 1 - HEADER.size)
+
+
+def list_images(directory):
+    return sorted(entry.path for entry in os.scandir(directory)
+                  if entry.is_file() and entry.name.lower().endswith(EXTENSIONS))
+
+
+def read_image(method, path):
+    img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        raise ValueError('cannot read image')
+    # dct works on the luma of a colour image, a gray image is its own luma
+    if method == 'dct' and img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    return img
+
+
+# Failures are returned rather than raised, so one bad image does not stop the others
+def embed_one(method, path, chunk, out_path):
+    start = time.perf_counter()
+    try:
+        img = METHODS[method].embed(read_image(method, path), chunk)
+        if not cv2.imwrite(out_path, img):
+            raise ValueError('cannot write {}'.format(out_path))
+    except Exception as error:
+        return path, None, time.perf_counter() - start, error
+    return path, len(chunk) - HEADER.size, time.perf_counter() - start, None
+
+
+def extract_one(method, path):
+    start = time.perf_counter()
+    try:
+        chunk = METHODS[method].recover(read_image(method, path))
+    except Exception:
+        chunk = b''
+    if len(chunk) < HEADER.size or chunk[:len(MAGIC)] != MAGIC:
+        return path, None, None, b'', time.perf_counter() - start
+    _, seq, total = HEADER.unpack(chunk[:HEADER.size])
+    return path, seq, total, chunk[HEADER.size:], time.perf_counter() - start
+
+
+def report(path, size, seconds):
+    print('{}: {} bytes in {:.3f}s ({:.2f} MB/s)'.format(
+        osp.basename(path), size, seconds, size / 1e6 / max(seconds, 1e-9)))
+
+
+def embed_dir(method, src, payload_path, dst, workers=None):
+    with open(payload_path, 'rb') as f:
+        payload = f.read()
+    images = list_images(src)
+    # Assign chunks from the header sizes before touching any pixels
+    plan = []
+    offset = 0
+    for path in images:
+        if offset >= len(payload):
+            break
+        size = usable_bytes(method, path)
+        if size:
+            plan.append((path, payload[offset:offset + size]))
+            offset += size
+    assert offset >= len(payload), "Payload overflow the capacity:{}".format(offset)
+
+    os.makedirs(dst, exist_ok=True)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = []
+        for seq, (path, data) in enumerate(plan):
+            chunk = HEADER.pack(MAGIC, seq, len(plan)) + data
+            # numbered names keep image.png and image.jpg from colliding
+            name = '{:05d}_{}{}'.format(seq, osp.splitext(osp.basename(path))[0], SUFFIX[method])
+            jobs.append(pool.submit(embed_one, method, path, chunk, osp.join(dst, name)))
+        failed = []
+        for job in as_completed(jobs):
+            path, size, seconds, error = job.result()
+            if error is not None:
+                print('{}: failed, {}'.format(osp.basename(path), error))
+                failed.append(path)
+            else:
+                report(path, size, seconds)
+    elapsed = time.perf_counter() - start
+    assert not failed, "Payload incomplete, {} images failed: {}".format(
+        len(failed), ', '.join(map(osp.basename, failed)))
+    print('Embedded {} bytes into {} images in {:.2f}s'.format(len(payload), len(plan), elapsed))
+
+
+def extract_dir(method, src, out_path, workers=None):
+    chunks = {}
+    total = None
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = [pool.submit(extract_one, method, path) for path in list_images(src)]
+        for job in as_completed(jobs):
+            path, seq, count, data, seconds = job.result()
+            if seq is None:
+                print('{}: no payload'.format(osp.basename(path)))
+                continue
+            report(path, len(data), seconds)
+            chunks[seq] = data
+            total = count
+    assert total is not None, "No payload found in {}".format(src)
+    missing = [seq for seq in range(total) if seq not in chunks]
+    assert not missing, "Missing chunks: {}".format(missing)
+    with open(out_path, 'wb') as f:
+        for seq in range(total):
+            f.write(chunks[seq])
+    elapsed = time.perf_counter() - start
+    print('Extracted {} bytes from {} images in {:.2f}s'.format(
+        sum(map(len, chunks.values())), total, elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hide a file across a directory of images')
+    parser.add_argument('--method', choices=sorted(METHODS), default='lsb')
+    parser.add_argument('--workers', type=int, default=None)
+    commands = parser.add_subparsers(dest='command', required=True)
+    embed_cmd = commands.add_parser('embed')
+    embed_cmd.add_argument('images')
+    embed_cmd.add_argument('payload')
+    embed_cmd.add_argument('output')
+    extract_cmd = commands.add_parser('extract')
+    extract_cmd.add_argument('images')
+    extract_cmd.add_argument('output')
+    args = parser.parse_args()
+    if args.command == 'embed':
+        embed_dir(args.method, args.images, args.payload, args.output, args.workers)
+    else:
+        extract_dir(args.method, args.images, args.output, args.workers)
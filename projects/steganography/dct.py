@@ -29,34 +29,16 @@ TABLE = np.array([
 ])
 
 
+# Orthonormal DCT-II basis, D @ block @ D.T matches cv2.dct on an 8x8 block
+_k, _n = np.meshgrid(np.arange(8), np.arange(8), indexing='ij')
+DCT_MAT = np.cos((2 * _n + 1) * _k * np.pi / 16) * np.sqrt(2 / 8)
+DCT_MAT[0] /= np.sqrt(2)
+DCT_MAT = DCT_MAT.astype(np.float32)
+
+
 def insert(path, txt):
     img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
-    txt = "{}{}{}".format(len(txt), FLAG, txt)
-    row, col = img.shape[:2]
-    max_bytes = (row // 8) * (col // 8) // 8
-    assert max_bytes >= len(
-        txt), "Message overflow the capacity:{}".format(max_bytes)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2YUV)
-    # Just use the Y plane to store message, you can use all plane
-    y, u, v = cv2.split(img)
-    y = y.astype(np.float32)
-    blocks = []
-    # Quantize blocks
-    for r_idx in range(0, 8 * (row // 8), 8):
-        for c_idx in range(0, 8 * (col // 8), 8):
-            quantized = cv2.dct(y[r_idx: r_idx+8, c_idx: c_idx+8]) / TABLE
-            blocks.append(quantized)
-    for idx in range(len(txt)):
-        encode(blocks[idx*8: (idx+1)*8], txt[idx])
-
-    idx = 0
-    # Restore Y plane
-    for r_idx in range(0, 8 * (row // 8), 8):
-        for c_idx in range(0, 8 * (col // 8), 8):
-            y[r_idx: r_idx+8, c_idx: c_idx+8] = cv2.idct(blocks[idx] * TABLE)
-            idx += 1
-    y = y.astype(np.uint8)
-    img = cv2.cvtColor(cv2.merge((y, u, v)), cv2.COLOR_YUV2BGR)
+    img = embed(img, txt)
     filename, _ = osp.splitext(path)
     # DCT algorithm can save message even if jpg
     filename += '_dct_embeded' + '.jpg'
@@ -64,60 +46,105 @@ def insert(path, txt):
     return filename
 
 
-# Encode a char into the blocks
+# Insert a str or bytes payload into a copy of the image
+def embed(img, payload):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    payload = "{}{}".format(len(payload), FLAG).encode() + payload
+    max_bytes = capacity(img.shape)
+    assert max_bytes >= len(
+        payload), "Message overflow the capacity:{}".format(max_bytes)
+    count = len(payload) * 8
+    rows = strip_rows(img.shape, count)
+    # Only the rows of blocks carrying the message go through YUV and back,
+    # the rest of the copy is left untouched
+    strip = cv2.cvtColor(img[:rows], cv2.COLOR_BGR2YUV)
+    # Just use the Y plane to store message, you can use all plane
+    y = strip[:, :, 0]
+    blocks = load_blocks(y, count)
+    encode(blocks, payload)
+    store_blocks(y, blocks)
+    img = img.copy()
+    img[:rows] = cv2.cvtColor(strip, cv2.COLOR_YUV2BGR)
+    return img
+
+
+def capacity(shape):
+    return (shape[0] // 8) * (shape[1] // 8) // 8
+
+
+# Pixel rows holding the first count 8x8 blocks in row-major order
+def strip_rows(shape, count):
+    cols = shape[1] // 8
+    return -(-count // cols) * 8
+
+
+# Y plane of only the rows holding the first count blocks
+def luma_strip(img, count):
+    rows = strip_rows(img.shape, count)
+    return cv2.cvtColor(img[:rows], cv2.COLOR_BGR2YUV)[:, :, 0]
+
+
+# Quantized DCT of the first count 8x8 blocks of plane, in row-major order
+def load_blocks(plane, count):
+    cols = plane.shape[1] // 8
+    rows = -(-count // cols)
+    area = plane[:rows * 8, :cols * 8].astype(np.float32)
+    blocks = area.reshape(rows, 8, cols, 8).swapaxes(1, 2).reshape(-1, 8, 8)
+    blocks = blocks[:count]
+    return DCT_MAT @ blocks @ DCT_MAT.T / TABLE
+
+
+# Write the blocks from load_blocks back into plane
+def store_blocks(plane, blocks):
+    cols = plane.shape[1] // 8
+    count = blocks.shape[0]
+    rows = -(-count // cols)
+    pixels = DCT_MAT.T @ (blocks * TABLE).astype(np.float32) @ DCT_MAT
+    pixels = np.clip(np.round(pixels), 0, 255).astype(plane.dtype)
+    area = plane[:rows * 8, :cols * 8]
+    tiles = area.reshape(rows, 8, cols, 8).swapaxes(1, 2).reshape(-1, 8, 8)
+    tiles[:count] = pixels
+    # reshape copies when the width isn't a multiple of 8 blocks
+    area[...] = tiles.reshape(rows, cols, 8, 8).swapaxes(1, 2).reshape(rows * 8, cols * 8)
+
+
+# Encode bytes into the blocks, one bit per block, low bit first
 def encode(blocks, data):
-    data = ord(data)
-    for idx in range(len(blocks)):
-        bit_val = (data >> idx) & 1
-        max_val = max(blocks[idx][LOC_MAX], blocks[idx][LOC_MIN])
-        min_val = min(blocks[idx][LOC_MAX], blocks[idx][LOC_MIN])
-        if max_val - min_val <= ALPHA:
-            max_val = min_val + ALPHA + 1e-3
-        if bit_val == 1:
-            blocks[idx][LOC_MAX] = max_val
-            blocks[idx][LOC_MIN] = min_val
-        else:
-            blocks[idx][LOC_MAX] = min_val
-            blocks[idx][LOC_MIN] = max_val
-
-
-# Decode a char from the blocks
+    data = np.frombuffer(data, dtype=np.uint8)
+    bits = np.unpackbits(data, bitorder='little').astype(bool)
+    high = blocks[:, LOC_MAX[0], LOC_MAX[1]]
+    low = blocks[:, LOC_MIN[0], LOC_MIN[1]]
+    max_val = np.maximum(high, low)
+    min_val = np.minimum(high, low)
+    max_val = np.where(max_val - min_val <= ALPHA, min_val + ALPHA + 1e-3, max_val)
+    blocks[:, LOC_MAX[0], LOC_MAX[1]] = np.where(bits, max_val, min_val)
+    blocks[:, LOC_MIN[0], LOC_MIN[1]] = np.where(bits, min_val, max_val)
+
+
+# Decode bytes from the blocks
 def decode(blocks):
-    val = 0
-    for idx in range(len(blocks)):
-        if blocks[idx][LOC_MAX] > blocks[idx][LOC_MIN]:
-            val |= 1 << idx
-    return chr(val)
+    bits = blocks[:, LOC_MAX[0], LOC_MAX[1]] > blocks[:, LOC_MIN[0], LOC_MIN[1]]
+    return np.packbits(bits, bitorder='little').tobytes()
 
 
-def extract(path):
+def extract(path, binary=False):
     img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
-    row, col = img.shape[:2]
-    max_bytes = (row // 8) * (col // 8) // 8
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2YUV)
-    y, u, v = cv2.split(img)
-    y = y.astype(np.float32)
-    blocks = []
-    for r_idx in range(0, 8 * (row // 8), 8):
-        for c_idx in range(0, 8 * (col // 8), 8):
-            quantized = cv2.dct(y[r_idx: r_idx+8, c_idx: c_idx+8]) / TABLE
-            blocks.append(quantized)
-    res = ''
-    idx = 0
-    # Extract the length of the message
-    while idx < max_bytes:
-        ch = decode(blocks[idx*8: (idx+1)*8])
-        idx += 1
-        if ch == FLAG:
-            break
-        res += ch
-    end = int(res) + idx
+    res = recover(img)
+    return res if binary else res.decode('utf-8')
+
+
+# Recover the payload bytes hidden by embed
+def recover(img):
+    max_bytes = capacity(img.shape)
+    # Extract the length of the message, it can't be longer than the capacity digits
+    count = min(max_bytes, len(str(max_bytes)) + 1) * 8
+    head = decode(load_blocks(luma_strip(img, count), count))
+    idx = head.find(FLAG.encode())
+    assert idx > 0 and head[:idx].isdigit(), "Input image isn't correct."
+    end = int(head[:idx]) + idx + 1
     assert end <= max_bytes, "Input image isn't correct."
-    res = ''
-    while idx < end:
-        res += decode(blocks[idx*8: (idx+1)*8])
-        idx += 1
-    return res
+    return decode(load_blocks(luma_strip(img, end * 8), end * 8)[(idx + 1) * 8:])
 
 
 if __name__ == '__main__':
@@ -7,6 +7,8 @@
 import cv2
 import math
 import os.path as osp
+import sys
+import time
 import numpy as np
 
 # Insert data in the low bit.
@@ -21,18 +23,7 @@ FLAG = '%'
 
 def insert(path, txt):
     img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
-    # Save origin shape to restore image
-    ori_shape = img.shape
-    max_bytes = ori_shape[0] * ori_shape[1] // BYTES_PER_BYTE
-    # Encode message with length
-    txt = '{}{}{}'.format(len(txt), FLAG, txt)
-    assert max_bytes >= len(
-        txt), "Message overflow the capacity:{}".format(max_bytes)
-    data = np.reshape(img, -1)
-    for (idx, val) in enumerate(txt):
-        encode(data[idx*BYTES_PER_BYTE: (idx+1) * BYTES_PER_BYTE], val)
-
-    img = np.reshape(data, ori_shape)
+    img = embed(img, txt)
     filename, _ = osp.splitext(path)
     # png is lossless encode that can restore message correctly
     filename += '_lsb_embeded' + ".png"
@@ -40,44 +31,93 @@ def insert(path, txt):
     return filename
 
 
-def extract(path):
+def extract(path, binary=False):
     img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    res = recover(img)
+    return res if binary else res.decode('utf-8')
+
+
+# Insert a str or bytes payload into a copy of the image
+def embed(img, payload):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    max_bytes = capacity(img.shape)
+    # Encode message with length
+    payload = '{}{}'.format(len(payload), FLAG).encode() + payload
+    assert max_bytes >= len(
+        payload), "Message overflow the capacity:{}".format(max_bytes)
+    img = img.copy()
+    encode(np.reshape(img, -1), payload)
+    return img
+
+
+# Recover the payload bytes hidden by embed
+def recover(img):
     data = np.reshape(img, -1)
-    total = data.shape[0]
-    res = ''
-    idx = 0
-    # Decode message length
-    while idx < total // BYTES_PER_BYTE:
-        ch = decode(data[idx*BYTES_PER_BYTE: (idx+1)*BYTES_PER_BYTE])
-        idx += 1
-        if ch == FLAG:
-            break
-        res += ch
-    end = int(res) + idx
-    assert end <= total // BYTES_PER_BYTE, "Input image isn't correct."
-
-    res = ''
-    while idx < end:
-        res += decode(data[idx*BYTES_PER_BYTE: (idx+1)*BYTES_PER_BYTE])
-        idx += 1
-    return res
+    max_bytes = data.shape[0] // BYTES_PER_BYTE
+    # Decode message length, it can't be longer than the capacity digits
+    head = decode(data, min(max_bytes, len(str(max_bytes)) + 1))
+    idx = head.find(FLAG.encode())
+    assert idx > 0 and head[:idx].isdigit(), "Input image isn't correct."
+    start = idx + 1
+    end = int(head[:idx]) + start
+    assert end <= max_bytes, "Input image isn't correct."
+    return decode(data[start * BYTES_PER_BYTE:], end - start)
+
+
+def capacity(shape):
+    return int(np.prod(shape)) // BYTES_PER_BYTE
 
 
+# Spread every byte of data over BYTES_PER_BYTE values of block, low bits first
 def encode(block, data):
-    data = ord(data)
-    for idx in range(len(block)):
-        block[idx] &= HIGH_BITS
-        block[idx] |= (data >> (BITS * idx)) & LOW_BITS
+    data = np.frombuffer(data, dtype=np.uint8)
+    bits = np.unpackbits(data[:, None], axis=1, bitorder='little')
+    if BYTES_PER_BYTE * BITS != 8:
+        # Pad each byte so it splits evenly into BITS wide groups
+        bits = np.pad(bits, ((0, 0), (0, BYTES_PER_BYTE * BITS - 8)))
+    bits = bits.reshape(-1, BITS)
+    groups = bits[:, 0].copy()
+    for idx in range(1, BITS):
+        groups |= bits[:, idx] << idx
+    used = block[:groups.shape[0]]
+    used &= HIGH_BITS
+    used |= groups
+
+
+# Read size bytes back from the low bits of block
+def decode(block, size):
+    groups = block[:size * BYTES_PER_BYTE] & LOW_BITS
+    groups = groups.reshape(size, BYTES_PER_BYTE)
+    val = groups[:, 0].copy()
+    for idx in range(1, BYTES_PER_BYTE):
+        # uint8 shifts drop the padding bits above the byte
+        val |= groups[:, idx] << (idx * BITS)
+    return val.tobytes()
+
 
+def benchmark(shape=(4000, 6000, 3)):
+    # 24 megapixel random image filled to capacity with random bytes
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, shape, dtype=np.uint8)
+    size = capacity(shape) - len(str(capacity(shape))) - 1
+    payload = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
 
-def decode(block):
-    val = 0
-    for idx in range(len(block)):
-        val |= (block[idx] & LOW_BITS) << (idx * BITS)
-    return chr(val)
+    start = time.perf_counter()
+    res = embed(img, payload)
+    mid = time.perf_counter()
+    assert recover(res) == payload
+    end = time.perf_counter()
+    mb = size / 1e6
+    print('{}x{} image, {:.1f} MB payload'.format(shape[1], shape[0], mb))
+    print('embed:   {:.3f}s ({:.1f} MB/s)'.format(mid - start, mb / (mid - start)))
+    print('extract: {:.3f}s ({:.1f} MB/s)'.format(end - mid, mb / (end - mid)))
 
 
 if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        benchmark()
+        sys.exit()
     data = 'A collection of simple python mini projects to enhance your Python skills.'
     input_path = "./example.png"
     res_path = insert(input_path, data)